@@ -0,0 +1,290 @@
+__all__ = ('Avatar','Targets','Bullets','Hits','Batch')
+
+import logging, os
+logger = logging.getLogger(__name__)
+
+from numpy import array, zeros, arange, newaxis, abs, nonzero, linspace, clip, argsort, unique, logical_or, less
+from numpy.random import SeedSequence, default_rng
+from concurrent.futures import ThreadPoolExecutor
+
+#--------------------------------------------------------------------------------------------------
+class Avatar (object):
+  """
+An object of this class implements the avatars of a batch of games.
+
+:param batch: the batch object
+:type batch: :class:`Batch`
+:param x: the initial horizontal position of the avatars in x-unit
+:type x: :const:`float`
+:param y: ignored (the avatars are not displayed)
+:param v: the horizontal speed of the avatars in x-unit/sec
+:type v: :const:`float`
+
+Attributes:
+
+.. attribute:: xpos
+
+   the current horizontal positions of the avatars as a :class:`numpy.array` (( *K* ,), :const:`float` )
+
+.. attribute:: xspeed
+
+   the horizontal speed of the avatars as a positive :const:`float` in x-unit/frame-transition
+  """
+#--------------------------------------------------------------------------------------------------
+
+  def __init__(self,batch,x=None,y=None,v=None):
+    self.batch = batch
+    self.xpos = zeros((batch.K,),float)
+    self.xpos[:] = x
+    self.xspeed = v/batch.fps
+
+  def update(self,k,s):
+    x = self.xpos[s]
+    x += self.batch.tr_move[s]*self.xspeed
+    clip(x,0.,1.,out=x)
+
+#--------------------------------------------------------------------------------------------------
+class Wave (object):
+  """
+An object of this class implements the waves of sprites of a batch of games, with the same semantics as :class:`shooter.Wave`: one sprite enters each wave at each frame transition, and is visible or not. The exposed sprites of all the games are held in 2D arrays with one row per game and *N* columns used as a circular buffer: the sprite entered at frame transition *t* is held in column *t* modulo *N*.
+
+:param batch: the batch object
+:type batch: :class:`Batch`
+:param v: vertical speed of the wave in y-unit/sec
+:type v: :const:`float`
+:param orient: direction of progress of the wave
+:type orient: :const:int (+ or - 1)
+
+Attributes:
+
+.. attribute:: N
+
+   the number of exposed sprites per game
+
+.. attribute:: xpos, xspeed, visible
+
+   the horizontal positions, speeds and visibility of the sprites as :class:`numpy.array` (( *K* , *N* ), :const:`float` / :const:`bool` )
+
+.. attribute:: ypos
+
+   the array of vertical positions of the exposed sprites by age rank (0 for the oldest) as a :class:`numpy.array` (( *N* ,), :const:`float` )
+  """
+#--------------------------------------------------------------------------------------------------
+
+  def __init__(self,batch,v=None,orient=None):
+    self.batch = batch
+    self.N = N = int(batch.fps/v)
+    self.xpos = zeros((batch.K,N),float)
+    self.xspeed = zeros((batch.K,N),float)
+    self.visible = zeros((batch.K,N),bool)
+    self.ypos = linspace(0.,1.,N)[::orient]
+
+  def update(self,k,s):
+    c = self.batch.t%self.N
+    self.leaving(k,s,c)
+    self.xpos[s] += self.xspeed[s]
+    self.entering(k,s,c)
+
+  def columns(self,rank):
+    """
+Returns the columns holding the sprites of given age ranks, during the current frame transition (after the wave update).
+    """
+    return (self.batch.t+1+rank)%self.N
+
+  def leaving(self,k,s,c): pass
+
+#--------------------------------------------------------------------------------------------------
+class Targets (Wave):
+  """
+An object of this class implements the waves of targets of a batch of games (see :class:`shooter.Targets`). Each chunk of games draws its targets from its own random generator.
+
+:param rate: the average number of targets created visible per sec
+:type rate: :const:`float`
+:param width: the width of a target in x-unit
+:type width: :const:`float`
+:param batch,ka: passed to parent class
+
+Attributes:
+
+.. attribute:: score
+
+   the cumulated number of miss per game as a :class:`numpy.array` (( *K* ,), :const:`int` )
+  """
+#--------------------------------------------------------------------------------------------------
+
+  def __init__(self,batch,rate=None,width=None,**ka):
+    self.rate = rate/batch.fps
+    self.width = width
+    self.score = zeros((batch.K,),int)
+    super(Targets,self).__init__(batch,orient=1,**ka)
+
+  def leaving(self,k,s,c):
+    miss = self.visible[s,c]
+    self.score[s] += miss
+    self.batch.tr_miss[s] = miss
+
+  def entering(self,k,s,c):
+    xpos,xposc,visible = self.batch.rngs[k].random((3,s.stop-s.start))
+    self.xpos[s,c] = xpos
+    self.xspeed[s,c] = (xposc-xpos)/self.N
+    self.visible[s,c] = visible<self.rate
+
+#--------------------------------------------------------------------------------------------------
+class Bullets (Wave):
+  """
+An object of this class implements the waves of bullets of a batch of games (see :class:`shooter.Bullets`). A bullet is visible when entered at a frame transition multiple of the reload time.
+
+:param rload: the time in sec between two visible bullets
+:type rload: :const:`float`
+:param batch,ka: passed to parent class
+  """
+#--------------------------------------------------------------------------------------------------
+
+  def __init__(self,batch,rload=None,**ka):
+    self.rload = int(rload*batch.fps)
+    super(Bullets,self).__init__(batch,orient=-1,**ka)
+
+  def entering(self,k,s,c):
+    self.xpos[s,c] = self.batch.avatar.xpos[s]
+    self.visible[s,c] = self.batch.t%self.rload == 0
+
+#--------------------------------------------------------------------------------------------------
+class Hits (object):
+  """
+An object of this class implements the hits (collisions target-bullet) of a batch of games (see :class:`shooter.Hits`). Only the pairs of target/bullet age ranks which can collide within a frame transition (time of collision in [0,1]) are tested; they are precomputed, so the cost per game is linear in the number of exposed sprites.
+
+:param batch: the batch object
+:type batch: :class:`Batch`
+:param timeout: ignored (hits are not displayed)
+
+Attributes:
+
+.. attribute:: tol
+
+   the tolerance in x-unit for a hit between a target and a bullet
+
+.. attribute:: pairs
+
+   the pairs of age ranks of targets and bullets which can collide, and their time of collision, as three :class:`numpy.array` of same length *P*, sorted by target rank
+
+.. attribute:: score
+
+   the cumulated number of hits per game as a :class:`numpy.array` (( *K* ,), :const:`int` )
+  """
+#--------------------------------------------------------------------------------------------------
+
+  def __init__(self,batch,timeout=None):
+    self.batch = batch
+    w,w1 = batch.targets,batch.bullets
+    self.tol = w.width/2
+    clashmat = (w.ypos[:,newaxis]-w1.ypos[newaxis,:])/(1./w.N+1./w1.N)
+    r,r1 = nonzero((clashmat>=0.)&(clashmat<=1.))
+    self.pairs = r,r1,clashmat[r,r1]
+    self.rows,self.rstart = unique(r,return_index=True)
+    o = argsort(r1,kind='stable')
+    self.order1 = o
+    self.rows1,self.rstart1 = unique(r1[o],return_index=True)
+    self.score = zeros((batch.K,),int)
+
+  def update(self,k,s):
+    w,w1 = self.batch.targets,self.batch.bullets
+    r,r1,m = self.pairs
+    c,c1 = w.columns(r),w1.columns(r1)
+    dx = w1.xpos[s][:,c1]
+    dx -= w.xpos[s][:,c]
+    dv = w1.xspeed[s][:,c1]
+    dv -= w.xspeed[s][:,c]
+    dv *= m
+    dx += dv
+    hit = less(abs(dx,out=dx),self.tol)
+    hit &= w.visible[s][:,c]
+    hit &= w1.visible[s][:,c1]
+    n = hit.sum(axis=1)
+    self.score[s] += n
+    self.batch.tr_hits[s] = n>0
+    if len(r):
+      w.visible[s,w.columns(self.rows)] &= ~logical_or.reduceat(hit,self.rstart,axis=1)
+      w1.visible[s,w1.columns(self.rows1)] &= ~logical_or.reduceat(hit[:,self.order1],self.rstart1,axis=1)
+
+#--------------------------------------------------------------------------------------------------
+class Batch (object):
+  """
+An object of this class implements a batch of *K* headless games with the same configuration, stepped together. The state of each component is held in arrays with one row per game, and each frame transition is a sequence of NumPy kernels over chunks of games. When *threads* is greater than 1, the chunks are stepped in parallel by a thread pool (NumPy releases the GIL in the kernels), so one process can use several cores without sharing state between processes.
+
+:param K: the number of games
+:type K: :const:`int`
+:param fps: the number of frames per second
+:param avatar,targets,bullets,hits: configuration of the components, as for :class:`shooter.Game`
+:type avatar,targets,bullets,hits: :const:`dict`
+:param seed: the seed of the random generators
+:type seed: :const:`int`
+:param chunks: the number of chunks of games (default: *threads*); each chunk has its own random generator, so the outcome depends on *seed* and *chunks*, but not on *threads*
+:type chunks: :const:`int`
+:param threads: the number of threads
+:type threads: :const:`int`
+
+Attributes:
+
+.. attribute:: K
+
+   the number of games
+
+.. attribute:: tr_move
+
+   the user input for a frame transition as a :class:`numpy.array` (( *K* ,), :const:`int` ) of move commands in -2,-1,0,1,2
+
+.. attribute:: tr_hits, tr_miss
+
+   the user output of the last frame transition as :class:`numpy.array` (( *K* ,), :const:`bool` )
+
+.. attribute:: t
+
+   the number of frame transitions performed so far
+
+.. attribute:: components
+
+   the component objects of the batch (avatar, targets, bullets, hits)
+  """
+#--------------------------------------------------------------------------------------------------
+
+  Factory = dict(avatar=Avatar,targets=Targets,bullets=Bullets,hits=Hits)
+
+  def __init__(self,K,fps=None,seed=None,chunks=None,threads=1,**config):
+    self.K = K
+    self.fps = fps
+    self.t = 0
+    if chunks is None: chunks = threads
+    b = linspace(0,K,chunks+1).astype(int)
+    self.chunks = [slice(lo,hi) for lo,hi in zip(b[:-1],b[1:])]
+    self.rngs = [default_rng(ss) for ss in SeedSequence(seed).spawn(chunks)]
+    self.pool = ThreadPoolExecutor(threads) if threads>1 else None
+    self.tr_move = zeros((K,),int)
+    self.tr_hits = zeros((K,),bool)
+    self.tr_miss = zeros((K,),bool)
+    self.components = []
+    for cn in ('avatar','targets','bullets','hits'):
+      c = self.Factory[cn](self,**config[cn])
+      self.components.append((cn,c))
+      setattr(self,cn,c)
+
+  def update(self):
+    if self.pool is None:
+      for k in range(len(self.chunks)): self.step(k)
+    else:
+      for x in self.pool.map(self.step,range(len(self.chunks))): pass
+    self.t += 1
+
+  def step(self,k):
+    s = self.chunks[k]
+    for cn,c in self.components: c.update(k,s)
+
+  def run(self,nframes,policy=None):
+    """
+Performs *nframes* frame transitions. If *policy* is not :const:`None`, it is called before each transition with the batch as argument, and must return the move commands of all the games.
+    """
+    for i in range(nframes):
+      if policy is not None: self.tr_move[:] = policy(self)
+      self.update()
+
+  def close(self):
+    if self.pool is not None: self.pool.shutdown()
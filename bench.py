@@ -0,0 +1,184 @@
+__all__ = ('wraparound','storage','threads','render')
+
+import logging, os
+logger = logging.getLogger(__name__)
+
+from numpy import zeros, percentile, median
+from time import thread_time, perf_counter
+
+from driver import Driver, newgame, randomkeys
+
+#--------------------------------------------------------------------------------------------------
+def wraparound(factory=None,nframes=100000,seed=0,**config):
+  """
+Measures the per-frame latency profile of the components of a headless game over many buffer wraparounds of its waves. The update time of each component is measured in thread CPU time (so that preemption by other processes does not show as spikes), and the frames are split into *storage* frames, where the storage of the wave changes otherwise than by the progress of its sprites (content produced, buffers flipped, wrapped around or compacted, see :func:`storage`), and *steady* frames (all the others). Returns a dictionary mapping each component name to a dictionary with:
+
+* ``steady``, ``storage``: the median, 99.9th percentile and maximum of the update time in sec on the steady, resp. storage frames (:const:`None` if there are none);
+* ``nstorage``: the number of storage frames;
+* ``ratio``: the ratio of the median update times on the storage and steady frames (a flat profile has a ratio close to 1, whatever the noise on the maxima);
+* ``spike``: the ratio maximum / median of the update time over all the frames.
+
+:param factory: the game class (default: :class:`shooter2.Game`)
+:param nframes: the number of frame transitions measured
+:type nframes: :const:`int`
+:param seed: the seed of the game and of the policy
+:type seed: :const:`int`
+:param config: the game configuration (default: :func:`run.config` with fast frames and slow targets, i.e. large waves)
+  """
+#--------------------------------------------------------------------------------------------------
+  if not config:
+    from run import config as default
+    config = default()
+    config.fps = 100
+    config.targets.v = .02
+    config.targets.rate = 20.
+  game = newgame(seed,factory,**config)
+  mgr = Driver(randomkeys(seed))
+  mgr.start(game)
+  lat = zeros((len(game.components),nframes),float)
+  event = zeros((len(game.components),nframes),bool)
+  for i in range(nframes):
+    mgr.keys = mgr.policy(game)
+    mgr.userinput(game)
+    for k,(cn,c) in enumerate(game.components):
+      s = storage(c)
+      t = thread_time()
+      c.update()
+      lat[k,i] = thread_time()-t
+      event[k,i] = storage(c) != s
+    mgr.useroutput(game)
+  def stats(l): return dict(zip(('median','p999','max'),(*percentile(l,(50,99.9)),l.max()))) if len(l) else None
+  R = {}
+  for (cn,c),l,e in zip(game.components,lat,event):
+    R[cn] = D = dict(steady=stats(l[~e]),storage=stats(l[e]),nstorage=int(e.sum()))
+    D['ratio'] = D['storage']['median']/D['steady']['median'] if D['storage'] else 1.
+    D['spike'] = l.max()/median(l)
+  return R
+
+def storage(c):
+  """
+Returns the storage counters of a component: those of its attributes ``nfill``, ``nstaged``, ``tlast`` (which change when content is produced, or buffers flipped or compacted) and the number of wraparounds of its circular buffers, :const:`None` when absent. Between two frames, they change only on the storage frames of a wave (see :func:`wraparound`), and never for the other components.
+  """
+  return tuple(getattr(c,a,None) for a in ('nfill','nstaged','tlast'))+(getattr(c,'nborn',0)//getattr(c,'M',1),)
+
+#--------------------------------------------------------------------------------------------------
+def threads(K=10000,nframes=200,threads=None,chunks=None,seed=0,**config):
+  """
+Measures the throughput of batched stepping (see :class:`batch.Batch`) for increasing numbers of threads. Returns a list of triples (number of threads, game frames per sec, speedup w.r.t. one thread).
+
+:param K: the number of games in the batch
+:type K: :const:`int`
+:param nframes: the number of frame transitions measured (after as many for warm-up)
+:type nframes: :const:`int`
+:param threads: the list of numbers of threads (default: powers of 2 up to the number of cpus)
+:param chunks: the number of chunks of games (default: number of cpus times 4)
+:type chunks: :const:`int`
+:param config: the game configuration (default: :func:`run.config`)
+  """
+#--------------------------------------------------------------------------------------------------
+  from batch import Batch
+  if not config: from run import config as default; config = default()
+  ncpu = os.cpu_count()
+  if threads is None: threads = [2**k for k in range(ncpu.bit_length()) if 2**k<=ncpu]
+  if chunks is None: chunks = 4*ncpu
+  L = []
+  for n in threads:
+    b = Batch(K,seed=seed,chunks=chunks,threads=n,**config)
+    b.run(nframes)
+    t = perf_counter()
+    b.run(nframes)
+    r = K*nframes/(perf_counter()-t)
+    b.close()
+    L.append((n,r,r/L[0][1] if L else 1.))
+  return L
+
+#--------------------------------------------------------------------------------------------------
+def render(densities=(100,1000,5000,20000),hits=.1,nframes=50,modes=('full','blit','raster','raster+blit'),size=(8.,6.),dpi=100,seed=0):
+  """
+Measures the draw time per frame of a game (see :meth:`shooter.Game.setup` / :meth:`shooter.Game.display`) on the non-interactive Agg canvas, with synthetic states of increasing sprite counts. Returns a list of dictionaries, one per density and rendering mode, with the number of sprites, the number of hits displayed, the median and 99th percentile of the draw time per frame in sec, and the maximum sustainable frame rates (inverse of those times).
+
+The rendering modes are: ``full`` (one scatter artist per component, full redraw of the figure at each frame, as by :class:`matplotlib.animation.FuncAnimation` without blitting), ``blit`` (same artists, animated over a cached background), ``raster`` (see :class:`shooter.Raster`, full redraw) and ``raster+blit``.
+
+:param densities: the numbers of displayed sprites (half targets, half bullets, plus the hits)
+:param hits: the number of hits displayed, as a fraction of the number of sprites (bounded by the capacity of the queue of hits)
+:type hits: :const:`float`
+:param nframes: the number of frames measured per density and mode
+:type nframes: :const:`int`
+:param modes: the rendering modes
+:param size,dpi: the size in inches and resolution of the figure (e.g. those of the target screen)
+:param seed: the seed of the synthetic states
+:type seed: :const:`int`
+  """
+#--------------------------------------------------------------------------------------------------
+  from matplotlib.figure import Figure
+  from matplotlib.backends.backend_agg import FigureCanvasAgg
+  from numpy.random import RandomState
+  from warnings import catch_warnings, simplefilter
+  from shooter import Game
+  from run import config as default, style
+  rng = RandomState(seed)
+  L = []
+  for S in densities:
+    config = default()
+    N = max(2,S//2)
+    config.targets.v = config.bullets.v = config.fps/(N+.5)
+    for mode in modes:
+      game = Game(**config)
+      for cn in ('targets','bullets'): # all the sprites visible
+        w = getattr(game,cn)
+        w.xpos[:] = rng.random_sample(2*w.N)
+        w.visible[:] = True
+      h = game.hits
+      H = min(h.size,int(hits*S))
+      h.record(rng.random_sample(H),rng.randint(0,game.targets.N,H))
+      mgr = Driver(render=('raster' if mode.startswith('raster') else 'scatter'),**style())
+      mgr.figure = fig = Figure(figsize=size,dpi=dpi)
+      canvas = FigureCanvasAgg(fig)
+      with catch_warnings(): # frame data caching of the animation, irrelevant here
+        simplefilter('ignore',UserWarning)
+        game.setup(mgr)
+      blit = mode.endswith('blit')
+      if blit:
+        A = [game.a_status]+([game.raster.artist] if game.raster is not None else [c.artist for cn,c in game.components])
+        for a in A: a.set_animated(True)
+        canvas.draw()
+        bg = canvas.copy_from_bbox(fig.bbox)
+      else: canvas.draw()
+      lat = zeros((nframes,),float)
+      for i in range(nframes):
+        for w in (game.targets,game.bullets): w.n = (w.n+1)%w.N # shift the exposed sprites
+        t = perf_counter()
+        if blit:
+          canvas.restore_region(bg)
+          game.display()
+          for a in A: fig.draw_artist(a)
+          canvas.blit(fig.bbox)
+        else:
+          game.display()
+          canvas.draw()
+        lat[i] = perf_counter()-t
+      D = dict(mode=mode,sprites=game.targets.N+game.bullets.N,hits=H)
+      D['median'],D['p99'] = percentile(lat,(50,99))
+      D['fps'],D['fps99'] = 1./D['median'],1./D['p99']
+      L.append(D)
+  return L
+
+if __name__ == '__main__':
+  import sys
+  import shooter, shooter2
+  logging.basicConfig(level=logging.INFO)
+  bench = sys.argv[1] if len(sys.argv)>1 else 'wraparound'
+  if bench == 'wraparound':
+    from fuzz import WGame
+    for factory in (shooter.Game,shooter2.Game,WGame): # WGame: shooter2 with the former storage of its waves
+      for cn,D in wraparound(factory).items():
+        for f in ('steady','storage'):
+          if D[f] is None: continue
+          print('{}.{}.{}: {}'.format(factory.__name__ if factory is WGame else factory.__module__,cn,f,', '.join('{}={:.1f}us'.format(k,1e6*v) for k,v in D[f].items())),'({} frames)'.format(D['nstorage']) if f=='storage' else '')
+        print('{}.{}: storage/steady=x{:.2f} spike=x{:.1f}'.format(factory.__name__ if factory is WGame else factory.__module__,cn,D['ratio'],D['spike']))
+  elif bench == 'threads':
+    for n,r,x in threads():
+      print('threads={}: {:.0f} game-frames/s, speedup=x{:.2f}'.format(n,r,x))
+  elif bench == 'render':
+    for D in render():
+      print('sprites={sprites} hits={hits} {mode}: median={0:.1f}ms p99={1:.1f}ms max fps={fps:.0f} (p99: {fps99:.0f})'.format(1000*D['median'],1000*D['p99'],**D))
@@ -0,0 +1,140 @@
+__all__ = ('greedy','lead','randommoves','steer','evaluate','Bots')
+
+import logging, os
+logger = logging.getLogger(__name__)
+
+from numpy import zeros, ones, abs, where, clip, rint, nonzero, lexsort, unique
+from numpy.random import default_rng
+from time import perf_counter
+
+#--------------------------------------------------------------------------------------------------
+# Reference policies for batches of games (see :class:`batch.Batch`). A policy is a callable which,
+# given the batch, returns the move commands of all its games, as an array (( K ,), int) in
+# -2,-1,0,1,2, computed by array operations over the state of the batch (no loop over the games).
+# Only the visible targets are considered, as a flat list of (game, column) pairs, since they are
+# sparse in the waves.
+#--------------------------------------------------------------------------------------------------
+
+def steer(dx,xspeed):
+  """
+Returns the move commands which bring avatars closest to given horizontal displacements in one frame transition.
+
+:param dx: the displacements in x-unit
+:param xspeed: the horizontal speed of the avatars in x-unit/frame-transition
+  """
+  return clip(rint(dx/xspeed),-2,2).astype(int)
+
+def pick(K,k,d,key):
+  """
+Returns, for each of *K* games, the displacement *d* of the candidate of the game with minimal *key* (0 if the game has no candidate). The candidates are given as flat arrays: game index *k*, displacement *d*, key *key*.
+  """
+  o = lexsort((key,k))
+  k,i = unique(k[o],return_index=True)
+  dx = zeros((K,),float)
+  dx[k] = d[o[i]]
+  return dx
+
+#--------------------------------------------------------------------------------------------------
+def greedy():
+  """
+Returns a policy which moves each avatar towards the visible target nearest to it horizontally (the avatar stays when there is none).
+  """
+#--------------------------------------------------------------------------------------------------
+  def policy(batch):
+    w,a = batch.targets,batch.avatar
+    k,c = nonzero(w.visible)
+    d = w.xpos[k,c]-a.xpos[k]
+    return steer(pick(batch.K,k,d,abs(d)),a.xspeed)
+  return policy
+
+#--------------------------------------------------------------------------------------------------
+def lead():
+  """
+Returns a policy which moves each avatar to intercept a target with the next visible bullet. For each target, the time of collision with that bullet is given by the timing of :attr:`shooter.Hits.clashmat` (for the newest bullet row) plus the wait until the bullet is fired; the aim point is the position of the target at that time, extrapolated from its horizontal speed. Among the targets whose aim point can be reached before the bullet is fired, the avatar goes for the lowest one (the first to escape); if there is none, for the nearest aim point.
+  """
+#--------------------------------------------------------------------------------------------------
+  cache = {}
+  def policy(batch):
+    w,w1,a = batch.targets,batch.bullets,batch.avatar
+    N = w.N
+    if 'clash' not in cache:
+      cache['clash'] = (w.ypos-w1.ypos[-1])/(1./w.N+1./w1.N) # time of collision with the newest bullet, by target rank
+    wait = (-batch.t)%w1.rload+1 # transitions until the next visible bullet is fired, included
+    k,c = nonzero(w.visible)
+    rank = (c-batch.t)%N # age rank of the targets
+    r = rank-wait # age rank when the bullet is fired
+    s = r>=0
+    k,c,rank,r = k[s],c[s],rank[s],r[s]
+    aim = w.xpos[k,c]+w.xspeed[k,c]*(wait+cache['clash'][r])
+    clip(aim,0.,1.,out=aim)
+    d = aim-a.xpos[k]
+    key = abs(d)
+    key = where(key<=2*a.xspeed*wait+batch.hits.tol,rank-N,key) # reachable targets first, lowest first
+    return steer(pick(batch.K,k,d,key),a.xspeed)
+  return policy
+
+#--------------------------------------------------------------------------------------------------
+def randommoves(seed=None,hold=.2,boost=.2):
+  """
+Returns a policy which issues random move commands, as :func:`driver.randomkeys` for each game: each command (left, right or none) is held for a random duration, with a given probability of boost.
+
+:param seed: the seed of the private random generator of the policy
+:type seed: :const:`int`
+:param hold: the average duration in sec of a command
+:type hold: :const:`float`
+:param boost: the probability of boost in a command
+:type boost: :const:`float`
+  """
+#--------------------------------------------------------------------------------------------------
+  rng = default_rng(seed)
+  state = {}
+  def policy(batch):
+    K = batch.K
+    moves = state.get('moves')
+    if moves is None: moves = state['moves'] = zeros((K,),int); change = ones((K,),bool)
+    else: change = rng.random(K) < 1./max(1.,hold*batch.fps)
+    n = change.sum()
+    moves[change] = rng.integers(-1,2,n)*where(rng.random(n)<boost,2,1)
+    return moves
+  return policy
+
+Bots = dict(greedy=greedy,lead=lead,random=randommoves)
+
+#--------------------------------------------------------------------------------------------------
+def evaluate(K=1000,nframes=2000,seed=0,policies=None,**config):
+  """
+Runs each reference policy on a batch of games, and returns, for each policy name, a dictionary with the mean number of hits and miss per game, the ratio hits/(hits+miss), and the time in sec spent in the policy and in the simulation.
+
+:param K: the number of games
+:type K: :const:`int`
+:param nframes: the number of frame transitions
+:type nframes: :const:`int`
+:param seed: the seed of the batch
+:type seed: :const:`int`
+:param policies: the names of the policies (default: all the policies of :data:`Bots`)
+:param config: the game configuration (default: :func:`run.config`)
+  """
+#--------------------------------------------------------------------------------------------------
+  from batch import Batch
+  if not config: from run import config as default; config = default()
+  R = {}
+  for name in (Bots if policies is None else policies):
+    policy = Bots[name]()
+    b = Batch(K,seed=seed,**config)
+    tp = ts = 0.
+    for i in range(nframes):
+      t0 = perf_counter()
+      b.tr_move[:] = policy(b)
+      t1 = perf_counter()
+      b.update()
+      ts += perf_counter()-t1
+      tp += t1-t0
+    b.close()
+    h,m = b.hits.score.mean(),b.targets.score.mean()
+    R[name] = dict(hits=h,miss=m,ratio=h/(h+m) if h+m else 0.,policy=tp,simulation=ts)
+  return R
+
+if __name__ == '__main__':
+  logging.basicConfig(level=logging.INFO)
+  for name,D in evaluate().items():
+    print('{}: hits={hits:.1f} miss={miss:.1f} ratio={ratio:.2%} policy={policy:.2f}s simulation={simulation:.2f}s'.format(name,**D))
@@ -0,0 +1,203 @@
+__all__ = ('Driver','scripted','randomkeys','newgame','soak','SoakError')
+
+import logging, os, tracemalloc
+logger = logging.getLogger(__name__)
+
+from numpy import array, zeros, median, percentile
+from numpy.random import RandomState, seed as rseed
+from time import perf_counter
+
+from shooter import GameManager, KEY_MOVELEFT, KEY_MOVERIGHT, KEY_BOOST, KEY_TERMINATE
+
+#--------------------------------------------------------------------------------------------------
+class Driver (GameManager):
+  """
+An object of this class is a GUI-free stand-in for a :class:`shooter.GameManager`. It follows the same :meth:`userinput` / :meth:`useroutput` contract, but the key controls are produced by a policy instead of the keyboard, and the notifications are counted instead of played.
+
+:param policy: a callable which, given the game, returns the key controls (bit-vector) for the next frame transition
+:param nframes: the number of frame transitions after which the quit command is issued (unlimited if :const:`None`)
+:type nframes: :const:`int`
+:param render,threshold: the rendering mode of the sprites, when the game is set up on a figure (see :class:`shooter.GameManager`)
+
+Attributes:
+
+.. attribute:: notified
+
+   a dictionary holding, for each notification (``hits``, ``miss``), the number of frame transitions in which it was issued
+  """
+#--------------------------------------------------------------------------------------------------
+
+  def __init__(self,policy=None,nframes=None,render='auto',threshold=1000,**config):
+    self.policy = (lambda game: 0) if policy is None else policy
+    self.nframes = nframes
+    self.render = render
+    self.threshold = threshold
+    self.notified = dict(hits=0,miss=0)
+    self.usernotify = self.notify
+    self.lowlatency = False
+    self.config = config
+
+  def play(self,game):
+    """
+Plays one *game* to the end, headless.
+
+:param game: the game to play
+:type game: :class:`shooter.Game`
+    """
+    self.start(game)
+    while not game.gameover: self.step()
+
+  def start(self,game):
+    self.game = game
+    self.keys = 0
+    self.pending, self.inflight, self.undrawn = [], [], []
+    self.latency = dict(logic=[],frame=[])
+
+  def step(self):
+    """
+Performs one frame transition of the current game, with the key controls given by the policy.
+    """
+    game = self.game
+    keys = self.policy(game)
+    if self.nframes is not None and game.nstep >= self.nframes: keys |= KEY_TERMINATE
+    self.keys = keys
+    self.transition(game)
+
+  def notify(self,sid): self.notified[sid] += 1
+  def close(self): pass
+
+#--------------------------------------------------------------------------------------------------
+def scripted(keys,loop=False):
+  """
+Returns a policy which replays a sequence of key controls, one per frame transition. When the sequence is exhausted, it is restarted if *loop* is :const:`True`, otherwise no key is pressed anymore.
+
+:param keys: a sequence of key controls (bit-vectors)
+:param loop: whether to restart the sequence when exhausted
+:type loop: :const:`bool`
+  """
+#--------------------------------------------------------------------------------------------------
+  keys = tuple(keys)
+  def policy(game):
+    n = game.nstep
+    if loop: n %= len(keys)
+    return keys[n] if n<len(keys) else 0
+  return policy
+
+#--------------------------------------------------------------------------------------------------
+def randomkeys(seed=None,hold=.2,boost=.2):
+  """
+Returns a policy which presses random key combinations. Each combination (left, right or none) is held for a random duration, with a given probability of boost.
+
+:param seed: the seed of the private random generator of the policy
+:type seed: :const:`int`
+:param hold: the average duration in sec of a combination
+:type hold: :const:`float`
+:param boost: the probability of boost in a combination
+:type boost: :const:`float`
+  """
+#--------------------------------------------------------------------------------------------------
+  rng = RandomState(seed)
+  choices = array((0,KEY_MOVELEFT,KEY_MOVERIGHT))
+  state = [0,0]
+  def policy(game):
+    if state[1] <= 0:
+      state[0] = int(choices[rng.randint(3)]) | (KEY_BOOST if rng.random_sample()<boost else 0)
+      state[1] = rng.geometric(1./max(1.,hold*game.fps))
+    state[1] -= 1
+    return state[0]
+  return policy
+
+#--------------------------------------------------------------------------------------------------
+def newgame(seed=None,factory=None,**config):
+  """
+Returns a new game, after seeding the global :mod:`numpy.random` generator (which the game components use).
+
+:param seed: the seed (no seeding if :const:`None`)
+:type seed: :const:`int`
+:param factory: the game class (default: :class:`shooter2.Game`)
+:param config: passed to the game class
+  """
+#--------------------------------------------------------------------------------------------------
+  if factory is None: from shooter2 import Game as factory
+  if seed is not None: rseed(seed)
+  return factory(**config)
+
+#--------------------------------------------------------------------------------------------------
+class SoakError (Exception):
+  """
+Raised by :func:`soak` when the memory grows or the per-frame latency drifts during a session. Attribute :attr:`report` holds the report of the session.
+  """
+  def __init__(self,msg,report):
+    super(SoakError,self).__init__(msg)
+    self.report = report
+
+#--------------------------------------------------------------------------------------------------
+def soak(game,policy=None,nframes=1000000,period=10000,warmup=2,trace=False,maxgrowth=1<<20,maxdrift=1.5):
+  """
+Runs one long headless session of *game* with a :class:`Driver` and tracks, every *period* frames, the RSS of the process, the memory traced by :mod:`tracemalloc` (if *trace* is set) and the median and 99th percentile of the per-frame latency. The first *warmup* periods serve as baseline. Returns the report of the session as a dictionary of :class:`numpy.array` (one entry per period), or raises :class:`SoakError` with that report if, at the end of the session, one memory measure exceeds its baseline by more than *maxgrowth* bytes, or if the median latency over the last *warmup* periods exceeds its baseline by a factor greater than *maxdrift*.
+
+:param game: the game to run
+:type game: :class:`shooter.Game`
+:param policy: passed to :class:`Driver`
+:param nframes: the number of frame transitions in the session
+:type nframes: :const:`int`
+:param period: the number of frames between two measures
+:type period: :const:`int`
+:param warmup: the number of periods over which the baseline is taken
+:type warmup: :const:`int`
+:param trace: whether to trace memory allocations (slower)
+:type trace: :const:`bool`
+:param maxgrowth: the maximum memory growth in bytes
+:type maxgrowth: :const:`int`
+:param maxdrift: the maximum latency drift factor
+:type maxdrift: :const:`float`
+  """
+#--------------------------------------------------------------------------------------------------
+  assert nframes >= 2*warmup*period
+  mgr = Driver(policy)
+  mgr.start(game)
+  lat = zeros((period,),float)
+  nperiods = nframes//period
+  R = dict((k,zeros((nperiods,),t)) for k,t in (('frame',int),('rss',int),('traced',int),('median',float),('p99',float)))
+  if trace: tracemalloc.start(); snap = None
+  try:
+    for k in range(nperiods):
+      for i in range(period):
+        t = perf_counter()
+        mgr.step()
+        lat[i] = perf_counter()-t
+      if game.gameover: raise Exception('Game ended before soak completed')
+      R['frame'][k] = game.nstep
+      R['rss'][k] = rss()
+      R['median'][k],R['p99'][k] = percentile(lat,(50,99))
+      if trace:
+        R['traced'][k] = tracemalloc.get_traced_memory()[0]
+        if k == warmup-1: snap = tracemalloc.take_snapshot()
+      logger.info('frame %d: rss=%d traced=%d median=%.1fus p99=%.1fus',game.nstep,R['rss'][k],R['traced'][k],1e6*R['median'][k],1e6*R['p99'][k])
+    growth = dict((m,R[m][-1]-R[m][:warmup].max()) for m in (('rss','traced') if trace else ('rss',)))
+    drift = median(R['median'][-warmup:])/median(R['median'][:warmup])
+    if trace and growth['traced'] > maxgrowth:
+      for stat in tracemalloc.take_snapshot().compare_to(snap,'lineno')[:10]: logger.warning('%s',stat)
+  finally:
+    if trace: tracemalloc.stop()
+  for m,g in growth.items():
+    if g > maxgrowth: raise SoakError('Memory growth ({}): {} bytes'.format(m,g),R)
+  if drift > maxdrift: raise SoakError('Latency drift: x{:.2f}'.format(drift),R)
+  return R
+
+def rss():
+  """
+Returns the current resident set size of the process in bytes (its peak value if :file:`/proc` is not available).
+  """
+  try:
+    with open('/proc/self/statm') as u: return int(u.read().split()[1])*os.sysconf('SC_PAGE_SIZE')
+  except OSError:
+    from resource import getrusage, RUSAGE_SELF
+    return getrusage(RUSAGE_SELF).ru_maxrss*1024
+
+if __name__ == '__main__':
+  import sys
+  from run import config
+  logging.basicConfig(level=logging.INFO)
+  nframes = int(sys.argv[1]) if len(sys.argv)>1 else 1000000
+  soak(newgame(0,**config()),randomkeys(0),nframes=nframes,period=max(1,nframes//100),trace='-t' in sys.argv)
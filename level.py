@@ -0,0 +1,115 @@
+__all__ = ('Level','precompile','save')
+
+import logging, os, json
+logger = logging.getLogger(__name__)
+
+from numpy import zeros, cumsum, memmap, dtype
+from numpy.random import RandomState
+
+MAGIC = b'mplshootergame-level-1\n'
+HEADER = 256
+RECORD = dtype([('born','<i8'),('xpos','<f8'),('xspeed','<f8')])
+
+#--------------------------------------------------------------------------------------------------
+class Level (object):
+  """
+An object of this class gives access to a level file, holding the precomputed spawn schedule of the targets of a whole session. The file is made of a fixed size header (JSON parameters) followed by the records of the targets in birth order (birthdate in frame number, horizontal position and speed), read through a :class:`numpy.memmap`.
+
+:param path: the path of the level file
+:type path: :const:`str`
+
+Attributes:
+
+.. attribute:: fps, N, rate
+
+   the parameters for which the level was built: the number of frames per sec, the number of exposed targets (see :class:`shooter2.Wave`), the rate of targets per sec
+
+.. attribute:: records
+
+   the schedule as a :class:`numpy.memmap` of records (``born``, ``xpos``, ``xspeed``)
+
+.. attribute:: cursor
+
+   the index of the next record to read
+  """
+#--------------------------------------------------------------------------------------------------
+
+  def __init__(self,path):
+    self.path = path
+    with open(path,'rb') as u: h = u.read(HEADER)
+    if not h.startswith(MAGIC): raise ValueError('Not a level file: {}'.format(path))
+    h = json.loads(h[len(MAGIC):].decode())
+    self.fps, self.N, self.rate = h['fps'], h['N'], h['rate']
+    self.records = memmap(path,dtype=RECORD,mode='r',offset=HEADER,shape=(h['count'],))
+    self.cursor = 0
+
+  def read(self,n):
+    """
+Returns the next *n* records of the schedule (fewer if the schedule is exhausted).
+    """
+    r = self.records[self.cursor:self.cursor+n]
+    self.cursor += len(r)
+    return r
+
+  def __getstate__(self): return dict(path=self.path,cursor=self.cursor)
+  def __setstate__(self,D):
+    self.__init__(D['path'])
+    self.cursor = D['cursor']
+
+#--------------------------------------------------------------------------------------------------
+def precompile(path,fps=None,v=None,rate=None,duration=None,seed=None,chunk=1<<16):
+  """
+Builds a level file holding the spawn schedule of the targets of a session, drawn as in :class:`shooter2.Targets`.
+
+:param path: the path of the level file
+:type path: :const:`str`
+:param fps: the number of frames per sec of the game
+:type fps: :const:`int`
+:param v,rate: the vertical speed and the rate of the targets, as in :class:`shooter2.Targets`
+:type v,rate: :const:`float`
+:param duration: the duration of the session in sec
+:type duration: :const:`float`
+:param seed: the seed of the random generator
+:type seed: :const:`int`
+  """
+#--------------------------------------------------------------------------------------------------
+  N = int(fps/v)
+  p = rate/fps
+  last = N+int(duration*fps)
+  rng = RandomState(seed)
+  t,count = N-1,0
+  with open(path,'wb') as u:
+    u.write(b'\0'*HEADER)
+    while t < last:
+      r = zeros((chunk,),RECORD)
+      r['born'] = t+cumsum(rng.geometric(p,(chunk,)))
+      xpos,xposc = rng.uniform(0.,1.,(2,chunk))
+      r['xpos'] = xpos
+      r['xspeed'] = (xposc-xpos)/N
+      r = r[r['born']<=last]
+      r.tofile(u)
+      count += len(r)
+      t = r['born'][-1] if len(r) else last
+    u.seek(0)
+    u.write(header(fps,N,rate,count))
+  logger.info('Level %s: %d targets over %d frames',path,count,last-N)
+
+#--------------------------------------------------------------------------------------------------
+def save(path,records,fps=None,N=None,rate=None):
+  """
+Builds a level file holding a given spawn schedule of the targets.
+
+:param path: the path of the level file
+:type path: :const:`str`
+:param records: the schedule, as an array of records of type :const:`RECORD` in birth order
+:param fps,N,rate: the parameters of the level (see :class:`Level`)
+  """
+#--------------------------------------------------------------------------------------------------
+  with open(path,'wb') as u:
+    u.write(header(fps,N,rate,len(records)))
+    records.astype(RECORD).tofile(u)
+
+def header(fps,N,rate,count):
+  h = MAGIC+json.dumps(dict(fps=fps,N=N,rate=rate,count=count)).encode()
+  if len(h) > HEADER: raise ValueError('Level header too long')
+  return h.ljust(HEADER,b' ')
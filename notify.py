@@ -0,0 +1,149 @@
+__all__ = ('Notifier','NullBackend','FileBackend','WinSoundBackend','Sound','loadsounds','defaultbackend')
+
+import logging, os, wave
+logger = logging.getLogger(__name__)
+
+from collections import namedtuple
+from queue import Queue
+from threading import Thread
+from time import perf_counter
+from math import inf
+
+Sound = namedtuple('Sound','data nchannels sampwidth framerate frames')
+Sound.__doc__ = 'A sound held in memory: the full content of its wav file (*data*), its format, and its decoded sample frames (*frames*)'
+
+#--------------------------------------------------------------------------------------------------
+def loadsounds(path):
+  """
+Returns a dictionary mapping each sound id to its :class:`Sound` in memory. The sound ids are the base names of the wav files in directory *path*.
+
+:param path: the directory containing the sound files
+:type path: :const:`str`
+  """
+#--------------------------------------------------------------------------------------------------
+  D = {}
+  for x in os.listdir(path):
+    sid,ext = os.path.splitext(x)
+    if ext != '.wav': continue
+    with open(os.path.join(path,x),'rb') as u: data = u.read()
+    with wave.open(os.path.join(path,x),'rb') as u:
+      D[sid] = Sound(data,u.getnchannels(),u.getsampwidth(),u.getframerate(),u.readframes(u.getnframes()))
+  return D
+
+#--------------------------------------------------------------------------------------------------
+class Notifier (object):
+  """
+An object of this class dispatches user notifications to a sound backend, asynchronously. A call with a sound id only pushes it onto a queue, so it never blocks the caller. A worker thread serves the queue: a sound id is played as soon as it is received, and a notification is dropped when a newer one of the same sound id is already queued, or when it was received within *window* sec of the last playback of its sound id (so that a backend which plays synchronously never accumulates a backlog of stale sounds). The worker thread is started on creation, stopped by :meth:`flush`, and restarted by the next notification.
+
+:param backend: the backend in charge of actually playing the sounds
+:param sounds: a dictionary mapping each sound id to its :class:`Sound`
+:type sounds: :const:`dict`
+:param window: the duration in sec of the coalescing window
+:type window: :const:`float`
+
+Attributes:
+
+.. attribute:: received, played
+
+   the number of notifications received, resp. played
+  """
+#--------------------------------------------------------------------------------------------------
+
+  def __init__(self,backend,sounds={},window=.04):
+    self.backend = backend
+    self.sounds = sounds
+    self.window = window
+    self.received = 0
+    self.played = 0
+    self.queue = Queue()
+    self.latest = {}
+    self.worker = None
+    self.start()
+
+  def __call__(self,sid):
+    self.received += 1
+    self.latest[sid] = k = self.received
+    if self.worker is None: self.start()
+    self.queue.put((sid,k,perf_counter()))
+
+  def start(self):
+    self.worker = Thread(target=self.serve,name='notifier',daemon=True)
+    self.worker.start()
+
+  def serve(self):
+    q = self.queue
+    last = {}
+    while True:
+      x = q.get()
+      if x is None: return
+      sid,k,t = x
+      if k < self.latest[sid]: continue # superseded by a newer notification in the queue
+      if t-last.get(sid,-inf) < self.window: continue # duplicate within the window
+      last[sid] = perf_counter()
+      try: self.backend.play(sid,self.sounds.get(sid))
+      except Exception: logger.exception('Failed to play sound: %s',sid)
+      self.played += 1
+
+  def flush(self):
+    """
+Serves the pending notifications and stops the worker thread (restarted by the next notification).
+    """
+    if self.worker is None: return
+    self.queue.put(None)
+    self.worker.join()
+    self.worker = None
+
+  def close(self):
+    """
+Flushes the pending notifications (see :meth:`flush`) and closes the backend.
+    """
+    self.flush()
+    self.backend.close()
+
+#--------------------------------------------------------------------------------------------------
+class NullBackend (object):
+  """
+An object of this class is a sound backend which plays nothing.
+  """
+#--------------------------------------------------------------------------------------------------
+  def play(self,sid,sound): pass
+  def close(self): pass
+
+#--------------------------------------------------------------------------------------------------
+class FileBackend (NullBackend):
+  """
+An object of this class is a sound backend which writes one line per playback into a file: the time in sec since its creation, the sound id and the number of sample frames of the sound.
+
+:param path: the path of the file
+:type path: :const:`str`
+  """
+#--------------------------------------------------------------------------------------------------
+  def __init__(self,path):
+    self.file = open(path,'w')
+    self.start = perf_counter()
+
+  def play(self,sid,sound):
+    n = 0 if sound is None else len(sound.frames)//(sound.nchannels*sound.sampwidth)
+    self.file.write('{:.6f} {} {}\n'.format(perf_counter()-self.start,sid,n))
+
+  def close(self): self.file.close()
+
+#--------------------------------------------------------------------------------------------------
+class WinSoundBackend (NullBackend):
+  """
+An object of this class is a sound backend which plays the sounds from memory using :mod:`winsound` (Windows only). Playback is synchronous, which only blocks the worker thread of the :class:`Notifier`.
+  """
+#--------------------------------------------------------------------------------------------------
+  def __init__(self):
+    from winsound import PlaySound, SND_MEMORY
+    self.playsound = lambda data: PlaySound(data,SND_MEMORY)
+
+  def play(self,sid,sound):
+    if sound is not None: self.playsound(sound.data)
+
+def defaultbackend():
+  """
+Returns a :class:`WinSoundBackend` if available, a :class:`NullBackend` otherwise.
+  """
+  try: return WinSoundBackend()
+  except ImportError: return NullBackend()
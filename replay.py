@@ -0,0 +1,224 @@
+__all__ = ('Archiver','Replay')
+
+import logging, os, json, pickle
+logger = logging.getLogger(__name__)
+
+from struct import Struct
+from importlib import import_module
+from numpy import array, memmap, uint8, dtype, frombuffer, searchsorted, concatenate
+from numpy.random import get_state, set_state
+
+from driver import Driver
+from run import todict
+
+MAGIC = b'mplshootergame-replay-1\n'
+LENGTH = Struct('<I')
+TRAILER = Struct('<QQ')
+INDEX = dtype([('frame','<i8'),('key','<i8'),('inputs','<i8')])
+# arrays derived from the configuration, not stored in the keyframes
+STATIC = ('targets.ypos','bullets.ypos','hits.clashmat','hits.ypos')
+
+def attrpath(x,path):
+  for a in path.split('.'): x = getattr(x,a)
+  return x
+
+#--------------------------------------------------------------------------------------------------
+class Archiver (Driver):
+  """
+An object of this class is a :class:`driver.Driver` which records its game into a seekable replay file (see :class:`Replay`). The file is made of:
+
+* a header: a magic string, then (with a length prefix) a JSON description of the game (class, configuration, seed, keyframe interval);
+* a sequence of blocks, one per *interval* frame transitions: a keyframe (the pickled game, including its component arrays except those derived from the configuration, and the state of the global :mod:`numpy.random` generator), followed by the key controls (one byte each) of the next frame transitions;
+* an index table, with the frame number and the offsets of the keyframe and of the key controls of each block;
+* a JSON summary of the session (number of frame transitions, scores), and a fixed size trailer holding the offsets of the index table and of the summary.
+
+The file is finalised when the game is over, or by :meth:`close`.
+
+:param path: the path of the replay file
+:type path: :const:`str`
+:param seed: the seed of the game, recorded in the header (informative)
+:type seed: :const:`int`
+:param interval: the number of frame transitions between two keyframes
+:type interval: :const:`int`
+:param ka: passed to :class:`driver.Driver`
+  """
+#--------------------------------------------------------------------------------------------------
+
+  def __init__(self,path,seed=None,interval=1000,**ka):
+    super(Archiver,self).__init__(**ka)
+    self.path = path
+    self.seed = seed
+    self.interval = interval
+    self.out = None
+
+  def start(self,game):
+    super(Archiver,self).start(game)
+    self.out = out = open(self.path,'wb')
+    self.index = []
+    self.ninputs = 0
+    h = json.dumps(dict(factory='{}.{}'.format(type(game).__module__,type(game).__name__),config=dict(fps=game.fps,**todict(game.config)),seed=self.seed,interval=self.interval)).encode()
+    out.write(MAGIC+LENGTH.pack(len(h))+h)
+    self.keyframe()
+
+  def keyframe(self):
+    out = self.out
+    k = out.tell()
+    S = dict((id(attrpath(self.game,p)),p) for p in STATIC)
+    P = pickle.Pickler(out,pickle.HIGHEST_PROTOCOL)
+    P.persistent_id = lambda x: S.get(id(x))
+    P.dump((self.game,get_state()))
+    self.index.append((self.game.nstep,k,out.tell()))
+
+  def useroutput(self,game):
+    super(Archiver,self).useroutput(game)
+    self.out.write(bytes((self.keys,)))
+    self.ninputs += 1
+    if game.gameover: self.close()
+    elif game.nstep%self.interval == 0: self.keyframe()
+
+  def close(self):
+    """
+Finalises the replay file (index table, summary, trailer).
+    """
+    out = self.out
+    if out is None: return
+    game = self.game
+    i = out.tell()
+    out.write(array(self.index,INDEX).tobytes())
+    s = out.tell()
+    out.write(json.dumps(dict(nstep=game.nstep,hits=game.hits.score,miss=game.targets.score,gameover=game.gameover,ninputs=self.ninputs)).encode())
+    out.write(TRAILER.pack(i,s))
+    out.close()
+    self.out = None
+
+#--------------------------------------------------------------------------------------------------
+class Replay (object):
+  """
+An object of this class gives access to a replay file (see :class:`Archiver`), read through a :class:`numpy.memmap`. Any frame can be restored by :meth:`seek`, which only simulates the frame transitions since the nearest keyframe. The keyframes are unpickled, which may execute arbitrary code: :meth:`seek` and :meth:`play` must never be used on untrusted files (see :func:`verify.check` for those).
+
+:param path: the path of the replay file
+:type path: :const:`str`
+
+Attributes:
+
+.. attribute:: header
+
+   the JSON header of the file as a dictionary (keys ``factory``, ``config``, ``seed``, ``interval``)
+
+.. attribute:: summary
+
+   the JSON summary of the file as a dictionary (keys ``nstep``, ``hits``, ``miss``, ``gameover``, ``ninputs``)
+
+.. attribute:: index
+
+   the index table of the blocks as a :class:`numpy.array` of records (``frame``, ``key``, ``inputs``)
+
+.. attribute:: game
+
+   the game at the last frame restored by :meth:`seek`
+  """
+#--------------------------------------------------------------------------------------------------
+
+  def __init__(self,path):
+    self.path = path
+    self.data = data = memmap(path,uint8,mode='r')
+    if data[:len(MAGIC)].tobytes() != MAGIC: raise ValueError('Not a replay file: {}'.format(path))
+    n, = LENGTH.unpack_from(data,len(MAGIC))
+    start = len(MAGIC)+LENGTH.size
+    self.header = json.loads(data[start:start+n].tobytes().decode())
+    i,s = TRAILER.unpack_from(data,len(data)-TRAILER.size)
+    if not start+n <= i <= s <= len(data)-TRAILER.size or (s-i)%INDEX.itemsize: raise ValueError('Corrupt trailer: {}'.format(path))
+    self.index = I = frombuffer(data[i:s],INDEX)
+    self.summary = json.loads(data[s:len(data)-TRAILER.size].tobytes().decode())
+    self.end = i # end of the last block
+    # the blocks must be in order, within the file, each holding the key controls up to the next keyframe
+    key,inputs,frame = I['key'],I['inputs'],I['frame']
+    nkey = concatenate((key[1:],(i,)))
+    if not len(I) or frame[0] < 0 or key[0] < start+n or not ((key<=inputs)&(inputs<=nkey)).all() or (frame[1:]-frame[:-1] != (nkey-inputs)[:-1]).any():
+      raise ValueError('Corrupt index table: {}'.format(path))
+    self.game = None
+    self.template = None
+
+  @property
+  def nframes(self):
+    """
+The number of frame transitions of the session (the last one may be the quit command).
+    """
+    return self.summary['nstep']
+
+  @property
+  def ninputs(self):
+    """
+The number of key controls recorded in the file, from the index table (without reading them).
+    """
+    I = self.index
+    return int((concatenate((I['key'][1:],(self.end,)))-I['inputs']).sum())
+
+  def factory(self):
+    """
+Returns the game class of the session.
+    """
+    m,c = self.header['factory'].rsplit('.',1)
+    return getattr(import_module(m),c)
+
+  def inputs(self,b=None):
+    """
+Returns the key controls recorded in block *b* (all the blocks if :const:`None`), as a :class:`numpy.array` of bytes.
+    """
+    if b is None: return concatenate([self.inputs(b) for b in range(len(self.index))])
+    end = self.index['key'][b+1] if b+1 < len(self.index) else self.end
+    return self.data[self.index['inputs'][b]:end]
+
+  def keyframe(self,b):
+    """
+Returns the game and the state of the global :mod:`numpy.random` generator recorded in the keyframe of block *b*.
+    """
+    from io import BytesIO
+    if self.template is None: # a game of the same configuration, source of the static arrays
+      rstate = get_state()
+      self.template = self.factory()(**self.header['config'])
+      set_state(rstate)
+    P = pickle.Unpickler(BytesIO(self.data[self.index['key'][b]:self.index['inputs'][b]]))
+    P.persistent_load = lambda p: attrpath(self.template,p)
+    return P.load()
+
+  def seek(self,frame):
+    """
+Returns the game as it was after *frame* frame transitions. The game is restored from the nearest keyframe before *frame* (or from the current game, if it is nearer), then simulated with the recorded key controls. The keyframe is unpickled, so the file must be trusted. The global :mod:`numpy.random` generator is left in the state of the session at that frame. The returned game is kept as the starting point of the next seek, so it must not be altered (copy it first).
+
+:param frame: the frame number, between 0 and :attr:`nframes`
+:type frame: :const:`int`
+    """
+    if not 0 <= frame <= self.nframes: raise ValueError('Frame out of range: {}'.format(frame))
+    b = searchsorted(self.index['frame'],frame,side='right')-1
+    f = int(self.index['frame'][b])
+    if self.game is not None and f <= self.game.nstep <= frame:
+      set_state(self.rstate)
+    else:
+      self.game,rstate = self.keyframe(b)
+      set_state(rstate)
+    game = self.game
+    mgr = Driver()
+    mgr.start(game)
+    while game.nstep < frame:
+      b = searchsorted(self.index['frame'],game.nstep,side='right')-1
+      keys = self.inputs(b)
+      f = int(self.index['frame'][b])
+      mgr.policy = lambda game: int(keys[game.nstep-f])
+      n = min(frame,f+len(keys))-game.nstep
+      if n <= 0: raise ValueError('Truncated replay file: {}'.format(self.path))
+      for i in range(n): mgr.step()
+    self.rstate = get_state()
+    return game
+
+  def play(self):
+    """
+Returns the game at the end of the session (including the quit command, if recorded), simulated from the nearest keyframe.
+    """
+    game = self.seek(self.nframes)
+    if self.summary['gameover']:
+      mgr = Driver(policy=lambda game: int(self.inputs(len(self.index)-1)[-1]))
+      mgr.start(game)
+      mgr.step()
+      self.game = None
+    return game
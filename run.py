@@ -12,7 +12,13 @@ class odict (MutableMapping):
   def __str__(self): return str(self.__dict__)
   def __repr__(self): return repr(self.__dict__)
 
-def game():
+def todict(c): return dict((k,todict(v)) for k,v in c.items()) if hasattr(c,'items') else c
+
+def getpath(c,path):
+  for k in path.split('.'): c = c[k]
+  return c
+
+def config():
   D = odict(
     fps=25,
     avatar=odict(x=.5,y=-.05,v=.125),
@@ -24,12 +30,12 @@ def game():
   D.targets.width = .04
   D.targets.rate = 1.
   D.hits.timeout = 2.
-  return Game(**D)
-  
-def mgr():
-  from matplotlib import rcParams
-  rcParams['toolbar'] = 'None'
+  return D
 
+def game():
+  return Game(**config())
+  
+def style():
   D = odict(
     avatar=odict(c='b',marker='^'),
     targets=odict(c='r',marker='_',linewidth=5),
@@ -37,8 +43,15 @@ def mgr():
     hits=odict(s=100,c='m',marker='*'),
     )
   # corrections
+  return D
 
-  return GameManager(**D)
+def mgr():
+  from matplotlib import rcParams
+  rcParams['toolbar'] = 'None'
+  return GameManager(**style())
 
-mgr().play(game())
+if __name__ == '__main__':
+  m = mgr()
+  m.play(game())
+  m.close()
 
@@ -0,0 +1,208 @@
+__all__ = ('Server','Session','encode','decode','readframe','check')
+
+import logging, os, asyncio
+logger = logging.getLogger(__name__)
+
+from collections import deque
+from struct import Struct
+from numpy import array, frombuffer, float32, concatenate, newaxis, percentile, mean
+
+from driver import Driver, newgame
+from shooter import KEY_TERMINATE
+
+LENGTH = Struct('<I')
+HEAD = Struct('<IfIIBHH')
+
+#--------------------------------------------------------------------------------------------------
+def encode(game):
+  """
+Returns the compact state frame of *game* (a :class:`shooter2.Game` with a single avatar, see :class:`Session`), as bytes: a length prefix, then the frame number, the avatar position, the hit and miss scores, the user output flags (bit 0: hits, bit 1: miss, bit 2: game over), the numbers of exposed targets and bullets, then their positions as :const:`float32` pairs.
+  """
+#--------------------------------------------------------------------------------------------------
+  L = []
+  for w in (game.targets,game.bullets):
+    a = w.current()
+    L.append(concatenate((w.xpos[a][:,newaxis],w.ypos[w.born[a]-w.cslice[0]]),axis=1).astype(float32).tobytes())
+  flags = bool(game.tr_hits)|bool(game.tr_miss)<<1|bool(game.gameover)<<2
+  b = HEAD.pack(game.nstep,game.avatar.pos[0,0],game.hits.score,game.targets.score,flags,len(L[0])//8,len(L[1])//8)+L[0]+L[1]
+  return LENGTH.pack(len(b))+b
+
+def decode(b):
+  """
+Returns the content of a state frame (without its length prefix) as a dictionary.
+  """
+  nstep,x,hits,miss,flags,nt,nb = HEAD.unpack_from(b)
+  p = frombuffer(b,float32,offset=HEAD.size).reshape((-1,2))
+  return dict(nstep=nstep,avatar=x,hits=hits,miss=miss,tr_hits=bool(flags&1),tr_miss=bool(flags&2),gameover=bool(flags&4),targets=p[:nt],bullets=p[nt:nt+nb])
+
+async def readframe(reader):
+  """
+Reads one state frame from a stream and returns its content (see :func:`decode`).
+  """
+  n, = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+  return decode(await reader.readexactly(n))
+
+#--------------------------------------------------------------------------------------------------
+def check(game):
+  """
+Raises :class:`ValueError` if *game* cannot be driven by a :class:`Session`: more than one avatar (the client sends one key control and :func:`encode` sends one avatar position), or waves too large for the counts of the state frame.
+  """
+#--------------------------------------------------------------------------------------------------
+  if game.avatar.P != 1: raise ValueError('Sessions support a single avatar only: P={}'.format(game.avatar.P))
+  n = max(len(game.targets.ialive),len(game.bullets.ialive))
+  if n >= 1<<16: raise ValueError('Waves too large for the state frame format: {} exposed sprites'.format(n))
+
+#--------------------------------------------------------------------------------------------------
+class Session (Driver):
+  """
+An object of this class drives a headless game on behalf of a client connected through a stream. Each byte received from the client is a key control bit-vector (as :attr:`shooter.GameManager.keys`), which holds until the next one; the session ends when the quit key is received or the client disconnects. After each frame transition, the state frame of the game (see :func:`encode`) is sent to the client.
+
+The frame transitions are scheduled at the *fps* of the game on the asyncio event loop. Each session yields to the loop after each transition, so that concurrent sessions are time-sliced fairly. When a session falls behind its schedule by more than *maxlag* sec, the schedule is reset (the game slows down instead of bursting). When the client does not read its frames and more than *highwater* bytes are pending, the session waits until they are drained (back-pressure).
+
+:param game: the game to drive
+:type game: :class:`shooter2.Game` (accepted by :func:`check`)
+:param reader,writer: the streams connected to the client
+:param maxlag: the maximum scheduling lag in sec
+:type maxlag: :const:`float`
+:param highwater: the maximum number of pending bytes
+:type highwater: :const:`int`
+
+Attributes:
+
+.. attribute:: lags
+
+   the scheduling lags (in sec) of the last frame transitions, as a :class:`collections.deque`
+
+.. attribute:: resets, stalled
+
+   the number of schedule resets, and the total time in sec spent waiting for the client to drain its frames
+  """
+#--------------------------------------------------------------------------------------------------
+
+  def __init__(self,game,reader,writer,maxlag=.5,highwater=1<<16,nlags=1000):
+    check(game)
+    super(Session,self).__init__(policy=lambda game: self.input)
+    self.start(game)
+    self.reader,self.writer = reader,writer
+    self.maxlag = maxlag
+    self.highwater = highwater
+    self.input = 0
+    self.lags = deque(maxlen=nlags)
+    self.resets = 0
+    self.stalled = 0.
+
+  async def listen(self):
+    try:
+      while True:
+        b = await self.reader.read(256)
+        if not b: break
+        self.input = b[-1]
+    except ConnectionError: pass
+    self.input = KEY_TERMINATE
+
+  async def run(self):
+    """
+Plays the game to the end.
+    """
+    loop = asyncio.get_running_loop()
+    listener = loop.create_task(self.listen())
+    game,writer = self.game,self.writer
+    period = 1./game.fps
+    deadline = loop.time()
+    try:
+      while not game.gameover:
+        deadline += period
+        delay = deadline-loop.time()
+        await asyncio.sleep(max(0.,delay))
+        lag = loop.time()-deadline
+        self.lags.append(lag)
+        if lag > self.maxlag: deadline = loop.time(); self.resets += 1
+        self.step()
+        writer.write(encode(game))
+        if writer.transport.get_write_buffer_size() > self.highwater:
+          t = loop.time()
+          await writer.drain()
+          self.stalled += loop.time()-t
+    finally:
+      listener.cancel()
+
+  def stats(self):
+    """
+Returns the scheduling statistics of the session as a dictionary.
+    """
+    L = array(self.lags) if self.lags else array((0.,))
+    return dict(nstep=self.game.nstep,lag=mean(L),lag99=percentile(L,99),resets=self.resets,stalled=self.stalled)
+
+#--------------------------------------------------------------------------------------------------
+class Server (object):
+  """
+An object of this class hosts concurrent headless game sessions (see :class:`Session`), one per client connected to a Unix domain socket, all stepped on one asyncio event loop.
+
+:param path: the path of the socket
+:type path: :const:`str`
+:param config: the game configuration (as for :func:`driver.newgame`)
+:type config: :const:`dict`
+:param factory: the game class (default: :class:`shooter2.Game`); a probe game is built to check the configuration (see :func:`check`)
+:param period: the time in sec between two logs of the scheduling statistics (none if :const:`None`)
+:type period: :const:`float`
+:param backlog: the maximum number of pending connections
+:type backlog: :const:`int`
+:param ka: passed to :class:`Session`
+
+Attributes:
+
+.. attribute:: sessions
+
+   the set of active sessions
+  """
+#--------------------------------------------------------------------------------------------------
+
+  def __init__(self,path,config,factory=None,period=None,backlog=1024,**ka):
+    check(newgame(None,factory,**config)) # all the sessions share the configuration: probe it once
+    self.path = path
+    self.config = config
+    self.factory = factory
+    self.period = period
+    self.backlog = backlog
+    self.ka = ka
+    self.sessions = set()
+
+  async def handle(self,reader,writer):
+    session = None
+    try:
+      session = Session(newgame(None,self.factory,**self.config),reader,writer,**self.ka)
+      self.sessions.add(session)
+      await session.run()
+    except ConnectionError: pass
+    finally:
+      self.sessions.discard(session)
+      writer.close()
+
+  async def serve(self):
+    """
+Serves clients until cancelled.
+    """
+    server = await asyncio.start_unix_server(self.handle,path=self.path,backlog=self.backlog)
+    async with server:
+      if self.period is None: await server.serve_forever()
+      else:
+        server_task = asyncio.get_running_loop().create_task(server.serve_forever())
+        while True:
+          await asyncio.sleep(self.period)
+          S = self.stats()
+          if S: logger.info('%d sessions: mean lag=%.1fms, max p99 lag=%.1fms, resets=%d',len(S),1000*mean([s['lag'] for s in S]),1000*max(s['lag99'] for s in S),sum(s['resets'] for s in S))
+
+  def stats(self):
+    """
+Returns the list of the scheduling statistics of the active sessions.
+    """
+    return [s.stats() for s in self.sessions]
+
+if __name__ == '__main__':
+  import sys
+  from run import config
+  logging.basicConfig(level=logging.INFO)
+  path = sys.argv[1] if len(sys.argv)>1 else 'shooter.sock'
+  try: asyncio.run(Server(path,config(),period=5.).serve())
+  finally:
+    if os.path.exists(path): os.remove(path)
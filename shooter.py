@@ -1,57 +1,66 @@
-__all__ = ('Avatar','Targets','Bullets','Hits','GameManager','Game')
+__all__ = ('Avatar','Targets','Bullets','Hits','GameManager','Game','Raster','RasterLayer','RasterImage')
 
 import logging, os
 logger = logging.getLogger(__name__)
 
 from numpy import array, zeros, ones, empty, arange, newaxis, abs, sum, square, sqrt, log, exp, argmin, argmax, amin, amax, nonzero, all, any, nan, isnan, dot, mean, average, std
-from numpy import clip, linspace, concatenate, unique
+from numpy import clip, linspace, concatenate, unique, histogram, inf, mgrid, uint8, uint32, atleast_1d
 from numpy.random import uniform
-from time import clock
+from time import perf_counter
 
 from matplotlib.animation import FuncAnimation
+from matplotlib.artist import Artist
 
 #--------------------------------------------------------------------------------------------------
 class Avatar (object):
   """
-An object of this class implements the avatar in a game.
+An object of this class implements the avatars in a game (one or several players). The move command of the game (:attr:`Game.tr_move`) is either a number, applied to all the avatars, or an array of one move per avatar.
 
 :param game: the game object
 :type game: :class:`Game`
-:param x: the horizontal position of the avatar in x-unit
-:type x: :const:`float`
-:param y: the vertical position of the avatar in y-unit
+:param x: the initial horizontal position of the avatar in x-unit, or the list of those of the avatars
+:type x: :const:`float` or list of :const:`float`
+:param y: the vertical position of the avatars in y-unit
 :type y: :const:`float`
-:param v: the horizontal speed of the avatar in x-unit/sec
+:param v: the horizontal speed of the avatars in x-unit/sec
 :type v: :const:`float`
 
 Attributes:
 
+.. attribute:: P
+
+   the number of avatars
+
 .. attribute:: pos
 
-   the current position of the avatar as a :class:`numpy.array` ((1,2), :const:`float` )
+   the current positions of the avatars as a :class:`numpy.array` (( *P* ,2), :const:`float` )
 
 .. attribute:: xspeed
 
-   the horizontal speed of the avatar as a positive :const:`float` in x-unit/frame-transition
+   the horizontal speed of the avatars as a positive :const:`float` in x-unit/frame-transition
 
 .. attribute:: artist
 
-   the artist in charge of displaying the avatar
+   the artist in charge of displaying the avatars
   """
 #--------------------------------------------------------------------------------------------------
 
   def __init__(self,game,x=None,y=None,v=None):
     self.game = game
-    self.pos = array(((x,y),))
+    x = atleast_1d(x)
+    self.P = len(x)
+    self.pos = zeros((self.P,2),float)
+    self.pos[:,0] = x
+    self.pos[:,1] = y
     self.xspeed = v/game.fps
 
   def update(self):
-    x = self.pos[0,0:1]
+    x = self.pos[:,0]
     x += self.game.tr_move*self.xspeed
     clip(x,0.,1.,out=x)
 
   def setup(self,ax,**style):
-    self.artist = ax.scatter((),(),**style)
+    self.artist = self.game.scatter(ax,**style)
 
   def display(self):
     self.artist.set_offsets(self.pos)
@@ -98,6 +107,18 @@ Attributes:
 
    the array of vertical positions of the exposed sprites ONLY as a :class:`numpy.array` (( *N* ,), :const:`float` )
 
+.. attribute:: page
+
+   the next page of the wave (horizontal positions, speeds, visibility of *N* sprites), produced incrementally while the current page is exposed, so that the page flip only copies arrays
+
+.. attribute:: nstaged
+
+   the number of sprites of the next page already produced
+
+.. attribute:: chunk
+
+   the number of sprites of the next page produced at each frame transition
+
 .. attribute:: artist
 
    the artist in charge of displaying the sprites
@@ -113,7 +134,10 @@ Attributes:
     self.xspeed = zeros((2*N,),float)
     self.visible = zeros((2*N,),bool)
     self.ypos = linspace(0.,1.,N)[slice(None,None,orient),newaxis]
-    self.xpos[N:], self.xspeed[N:], self.visible[N:] = self.newpage()
+    self.page = zeros((N,),float), zeros((N,),float), zeros((N,),bool)
+    self.nstaged = 0
+    self.chunk = max(1,N//8)
+    self.flip()
 
   def update(self):
     n,N = self.n,self.N
@@ -122,14 +146,26 @@ Attributes:
     if self.visible[m]: self.entering(m)
     self.xpos[n:m] += self.xspeed[n:m]
     n += 1
-    if n==N:
-      self.xpos[:N], self.xspeed[:N], self.visible[:N] = self.xpos[N:], self.xspeed[N:], self.visible[N:]
-      self.xpos[N:], self.xspeed[N:], self.visible[N:] = self.newpage()
-      n = 0
+    if n==N: self.flip(); n = 0
+    else: self.stage(self.chunk)
     self.n = n
 
+  def stage(self,k):
+    i = self.nstaged
+    j = min(self.N,i+k)
+    if i<j:
+      for c,x in zip(self.page,self.newcontent(i,j)): c[i:j] = x
+      self.nstaged = j
+
+  def flip(self):
+    N = self.N
+    self.stage(N)
+    self.xpos[:N], self.xspeed[:N], self.visible[:N] = self.xpos[N:], self.xspeed[N:], self.visible[N:]
+    self.xpos[N:], self.xspeed[N:], self.visible[N:] = self.page
+    self.nstaged = 0
+
   def setup(self,ax,**style):
-    self.artist = ax.scatter((),(),**style)
+    self.artist = self.game.scatter(ax,**style)
 
   def display(self):
     xpos,xspeed,visible = self.current()
@@ -176,10 +212,9 @@ Attributes:
     self.score = 0
     super(Targets,self).__init__(game,orient=1,**ka)
 
-  def newpage(self):
-    N = self.N
-    xpos,xposc,visible = uniform(0.,1.,(3,N))
-    xspeed = (xposc-xpos)/N
+  def newcontent(self,i,j):
+    xpos,xposc,visible = uniform(0.,1.,(3,j-i))
+    xspeed = (xposc-xpos)/self.N
     return xpos, xspeed, visible<self.rate
 
   def leaving(self,n):
@@ -211,14 +246,12 @@ Attributes:
 #--------------------------------------------------------------------------------------------------
 
   def __init__(self,game,rload=None,**ka):
+    if game.avatar.P != 1: raise ValueError('Multiple avatars not supported (see shooter2): P={}'.format(game.avatar.P))
     self.rload = int(rload*game.fps)
     super(Bullets,self).__init__(game,orient=-1,**ka)
 
-  def newpage(self):
-    N = self.N
-    visible = zeros(N,bool)
-    visible[arange(0,N,self.rload)] = True
-    return 0.5, 0., visible
+  def newcontent(self,i,j):
+    return 0.5, 0., arange(i,j)%self.rload==0
 
   def entering(self,n):
     self.xpos[n] = self.game.avatar.pos[0,0]
@@ -247,17 +280,25 @@ Attributes:
 
    a matrix (number of targets / number of bullets) containing the time of a collision in the next frame transition (if lower than 0 or greater than 1, no collision occurs)
 
-.. attribute:: xpos
+.. attribute:: ypos
 
-   the array of horizontal positions of the hits in x-unit
+   the array of vertical positions of the rows of targets in y-unit
 
-.. attribute:: ypos
+.. attribute:: size
+
+   the capacity of the queue of active hits, which is also an upper bound of the number of targets hit within *timeout* frames
 
-   the array of vertical positions of the hits in y-unit
+.. attribute:: xpos, row, expiry
 
-.. attribute:: weight
+   the arrays (of length *size* ) holding the queue of active (visible) hits: horizontal position in x-unit, row of the hit target, frame number from which the hit is no longer visible; the active hits are at the (circular) indices *head* .. *tail* - 1 modulo *size*; since all the hits have the same *timeout*, they expire in FIFO order
 
-   the array of remaining visibility duration (in number of frames) of the hits
+.. attribute:: head, tail
+
+   the number of hits removed from the queue, resp. inserted in the queue, so far
+
+.. attribute:: t
+
+   the number of frame transitions performed so far
 
 .. attribute:: artist
 
@@ -279,8 +320,11 @@ Attributes:
     N1 = game.bullets.N
     self.clashmat = (r-r1.T)/(1./N+1./N1)
     self.ypos = r
-    self.xpos = zeros((N,),float)
-    self.weight = zeros((N,),int)
+    self.size = N+self.timeout
+    self.xpos = zeros((self.size,),float)
+    self.row = zeros((self.size,),int)
+    self.expiry = zeros((self.size,),int)
+    self.head = self.tail = self.t = 0
     self.score = 0
 
   def update(self):
@@ -294,20 +338,42 @@ Attributes:
       if len(nz)>0:
         self.game.tr_hits = True
         self.score += len(nz)
-        s = nonzero(visible)[0][nz]
+        s = unique(nonzero(visible)[0][nz])
         visible[s] = False
-        self.weight[s] = self.timeout
-        self.xpos[s] = x[s]
+        self.record(x[s],s)
         visible1[nonzero(visible1)[0][nz1]] = False
-    self.weight -= 1
-    clip(self.weight,0,self.timeout,self.weight)
+    self.age()
+
+  def record(self,x,r):
+    """
+Inserts hits at the tail of the queue.
+
+:param x: the horizontal positions of the hits
+:param r: the rows of the hit targets
+    """
+    i = self.active(self.tail,len(r))
+    self.xpos[i] = x
+    self.row[i] = r
+    self.expiry[i] = self.t+self.timeout
+    self.tail += len(r)
+
+  def age(self):
+    """
+Ends the current frame transition and removes the expired hits from the head of the queue.
+    """
+    self.t += 1
+    while self.head < self.tail and self.expiry[self.head%self.size] <= self.t: self.head += 1
+
+  def active(self,start=None,n=None):
+    if start is None: start,n = self.head,self.tail-self.head
+    return (start+arange(n))%self.size
 
   def setup(self,ax,**style):
-    self.artist = ax.scatter((),(),**style)
+    self.artist = self.game.scatter(ax,**style)
 
   def display(self):
-    m = self.weight>0
-    self.artist.set_offsets(concatenate((self.xpos[m][:,newaxis],self.ypos[m]),axis=1))
+    i = self.active()
+    self.artist.set_offsets(concatenate((self.xpos[i][:,newaxis],self.ypos[self.row[i]]),axis=1))
 
 #--------------------------------------------------------------------------------------------------
 class Game (object):
@@ -330,7 +396,7 @@ An object of this class implements the full functionality of the game with its c
 
 .. attribute:: tr_move, tr_quit
 
-   the user input for a frame transition; :attr:`tr_move` : user move command in -2,-1,0,1,2; :attr:`tr_quit` : user quit command :const:`bool`
+   the user input for a frame transition; :attr:`tr_move` : user move command in -2,-1,0,1,2 (or an array of such commands, one per avatar); :attr:`tr_quit` : user quit command :const:`bool`
 
 .. attribute:: tr_hits, tr_miss
 
@@ -355,13 +421,23 @@ An object of this class implements the full functionality of the game with its c
 .. attribute:: components
 
    the component objects of the game (avatar, targets, bullets, hits)
+
+.. attribute:: config
+
+   the configuration of the components, as passed to the constructor
+
+.. attribute:: version
+
+   the version of the semantics of the game class (class attribute), to be incremented by any change of the outcome of a seeded session, so that stored outcomes (e.g. in the cache of :func:`sweep.sweep`) are not reused across such changes
   """
 #--------------------------------------------------------------------------------------------------
 
   Factory = dict(avatar=Avatar,targets=Targets,bullets=Bullets,hits=Hits)
+  version = 1
 
   def __init__(self,fps=None,**config):
     self.fps = fps
+    self.config = config
     self.nstep = 0
     self.gameover = False
     self.status = 'time: 0'
@@ -373,7 +449,7 @@ An object of this class implements the full functionality of the game with its c
       setattr(self,cn,c)
 
   def update(self):
-    start = clock()
+    start = perf_counter()
     if self.tr_quit:
       self.gameover = True
       self.status = 'Game over. Efficiency (logic): {:.2%}'.format(self.perf*self.fps)
@@ -385,21 +461,22 @@ An object of this class implements the full functionality of the game with its c
       score = '{:.2f}'.format(100*float(hit)/float(total)) if total else '*'
       self.nstep += 1
       self.status = 'time: {:06.1f}; hit: {}; miss: {}; score: {}'.format(self.nstep/self.fps,hit,miss,score)
-      self.perf += (clock()-start-self.perf)/self.nstep
+      self.perf += (perf_counter()-start-self.perf)/self.nstep
 
   def setup(self,mgr):
     def loop():
       while not self.gameover:
         yield
-        mgr.userinput(self)
-        self.update()
-        mgr.useroutput(self)
+        mgr.transition(self)
       yield
     ax = mgr.figure.add_axes((0,0,1,1),xticks=(),yticks=())
     ax.set_xlim(0.,1.)
     ax.set_ylim(-.1,1.)
     ax.axhline(0.,c='k')
     self.a_status = ax.text(.01,-.09,'*',fontsize='xx-small',bbox=dict(edgecolor='k',facecolor='none'))
+    render = mgr.render
+    if render == 'auto': render = 'raster' if self.capacity() > mgr.threshold else 'scatter'
+    self.raster = Raster(ax) if render == 'raster' else None
     for cn,c in self.components: c.setup(ax,**mgr.config[cn])
     F = lambda *a: self.display()
     self.anim = FuncAnimation(mgr.figure,frames=loop,interval=1000/self.fps,func=F)
@@ -407,6 +484,176 @@ An object of this class implements the full functionality of the game with its c
   def display(self):
     self.a_status.set_text(self.status)
     for cn,c in self.components: c.display()
+    if self.raster is not None: self.raster.flush()
+
+  def scatter(self,ax,**style):
+    """
+Returns an artist for a set of sprites, with a method :meth:`set_offsets` (a :class:`matplotlib.collections.PathCollection` or a :class:`RasterLayer` depending on the rendering mode).
+    """
+    return ax.scatter((),(),**style) if self.raster is None else self.raster.scatter(**style)
+
+  def capacity(self):
+    """
+Returns the maximum number of sprites displayed at once.
+    """
+    return self.avatar.P+self.targets.N+self.bullets.N+self.hits.size
+
+#--------------------------------------------------------------------------------------------------
+class Raster (object):
+  """
+An object of this class renders sets of sprites into a single RGBA image of bytes, preallocated at the pixel size of the axes and drawn as is (without resampling) by one :class:`RasterImage` artist. Each set of sprites is a :class:`RasterLayer`, whose stamps are written directly into the pixels they cover, which avoids the marker path pipeline of :func:`matplotlib.axes.Axes.scatter` when sprites are numerous. At each frame, only the pixels written at the previous frame are cleared, and only the pixels covered by the sprites are composited, so the cost of a frame is proportional to the number of sprites, not to the size of the image.
+
+:param ax: the axes of the game
+:type ax: :class:`matplotlib.axes.Axes`
+
+Attributes:
+
+.. attribute:: image
+
+   the RGBA image as a :class:`numpy.array` (( *H* , *W* , 4), :const:`uint8` ), bottom row first, at the pixel size of the axes (reallocated by :meth:`fit` when it changes)
+
+.. attribute:: layers
+
+   the list of :class:`RasterLayer` objects, in drawing order
+
+.. attribute:: written, nwritten
+
+   the flat indices of the pixels of the image written at the last frame (one array per layer), and their number; they are cleared at the next frame, unless they cover a large part of the image, which is then cleared at once
+
+.. attribute:: artist
+
+   the artist in charge of displaying the image
+  """
+#--------------------------------------------------------------------------------------------------
+
+  def __init__(self,ax):
+    self.ax = ax
+    self.extent = None
+    self.layers = []
+    self.fit()
+    self.artist = RasterImage(self)
+    ax.add_artist(self.artist)
+
+  def fit(self):
+    """
+Reallocates the image when the pixel extent of the axes (or the resolution or limits) has changed since the last call, e.g. when the figure is resized or rescaled by the backend after the game setup, and recomputes the stamps of the layers. Returns whether the image was reallocated.
+    """
+    ax = self.ax
+    bbox = ax.get_window_extent()
+    extent = bbox.bounds,ax.figure.dpi,ax.get_xlim(),ax.get_ylim()
+    if extent == self.extent: return False
+    self.extent = extent
+    self.W,self.H = W,H = max(1,int(bbox.width)),max(1,int(bbox.height))
+    self.x0,self.y0 = bbox.x0,bbox.y0
+    self.dpi = ax.figure.dpi
+    self.xlim,self.ylim = ax.get_xlim(),ax.get_ylim()
+    self.image = zeros((H,W,4),uint8)
+    self.written = []
+    self.nwritten = 0
+    for layer in self.layers: layer.stamp()
+    return True
+
+  def scatter(self,s=None,c=None,marker=None,linewidth=None,linewidths=None,**ka):
+    from matplotlib import rcParams
+    from matplotlib.colors import to_rgba
+    if s is None: s = rcParams['lines.markersize']**2
+    if linewidth is None: linewidth = rcParams['lines.linewidth'] if linewidths is None else linewidths
+    layer = RasterLayer(self,s,marker,linewidth,to_rgba('C0' if c is None else c))
+    self.layers.append(layer)
+    return layer
+
+  def flush(self):
+    """
+Redraws the image from the current offsets of all the layers.
+    """
+    img = self.image.view(uint32).reshape((-1,)) # one word per pixel
+    if self.nwritten > len(img)//8: img.fill(0) # dense frame: a plain fill is cheaper
+    else:
+      for i in self.written: img[i] = 0
+    self.written = [layer.splat(img) for layer in self.layers]
+    self.nwritten = sum([len(i) for i in self.written])
+    self.artist.stale = True
+
+class RasterLayer (object):
+  """
+An object of this class holds a set of sprites rendered by a :class:`Raster`: a marker (size in points^2, shape, line width) and a color, from which a stamp (pixel offsets of the marker around its center, upwards) is computed at the resolution of the raster.
+  """
+  def __init__(self,raster,s,marker,linewidth,rgba):
+    self.raster = raster
+    self.s,self.marker,self.linewidth = s,marker,linewidth
+    self.rgba = array(rgba,float)
+    self.word = (self.rgba*255+.5).astype(uint8).view(uint32)[0]
+    self.offsets = zeros((0,2),float)
+    self.stamp()
+
+  def stamp(self):
+    R,marker = self.raster,self.marker
+    d = sqrt(self.s)*R.dpi/72. # marker size in pixels
+    r = max(1,int(d/(4 if marker == '.' else 2)))
+    dy,dx = (a.ravel() for a in mgrid[-r:r+1,-r:r+1])
+    if marker == '_':
+      h = max(0,int(self.linewidth*R.dpi/144.))
+      m = abs(dy) <= h
+    elif marker == '|':
+      h = max(0,int(self.linewidth*R.dpi/144.))
+      m = abs(dx) <= h
+    elif marker == '^': m = 2*abs(dx) <= r-dy
+    elif marker == 'v': m = 2*abs(dx) <= r+dy
+    elif marker == 's': m = dx == dx
+    else: m = square(dx)+square(dy) <= square(r)
+    self.dx,self.dy = dx,dy = dx[m],dy[m]
+    self.r = max(abs(dx).max(),abs(dy).max())
+    self.flat = dx+dy*R.W # flat offsets of the stamp in the image
+
+  def set_offsets(self,offsets): self.offsets = offsets
+
+  def splat(self,img):
+    """
+Composites the stamps of the sprites over the flat image *img* (one word per pixel) and returns the flat indices of the pixels covered. The stamps of the sprites away from the borders are written without clipping.
+    """
+    R = self.raster
+    W,H,r = R.W,R.H,self.r
+    (x0,x1),(y0,y1) = R.xlim,R.ylim
+    x = ((self.offsets[:,0]-x0)*(W/(x1-x0))).astype(int)
+    y = ((self.offsets[:,1]-y0)*(H/(y1-y0))).astype(int)
+    inner = (x>=r)&(x<W-r)&(y>=r)&(y<H-r)
+    i = ((y[inner]*W+x[inner])[:,newaxis]+self.flat).ravel()
+    if not inner.all():
+      b = ~inner
+      x,y = x[b][:,newaxis]+self.dx,y[b][:,newaxis]+self.dy
+      m = (x>=0)&(x<W)&(y>=0)&(y<H)
+      i = concatenate((i,y[m]*W+x[m]))
+    if self.rgba[3] == 1.: img[i] = self.word; return i # opaque: coverage irrelevant
+    img = img.view(uint8).reshape((-1,4))
+    i,cov = unique(i,return_counts=True)
+    a = 1.-(1.-self.rgba[3])**cov
+    dst = img[i]/255.
+    a0 = dst[:,3]*(1.-a)
+    ao = a+a0
+    dst[:,:3] = (self.rgba[:3]*a[:,newaxis]+dst[:,:3]*a0[:,newaxis])/ao[:,newaxis]
+    dst[:,3] = ao
+    img[i] = (dst*255+.5).astype(uint8)
+    return i
+
+class RasterImage (Artist):
+  """
+An object of this class is an artist which draws the image of a :class:`Raster` (bottom row first) at the position in pixels of its axes, without resampling. The raster is refitted (see :meth:`Raster.fit`) and redrawn first if the axes have changed since its last frame.
+
+:param raster: the raster
+  """
+  def __init__(self,raster):
+    super(RasterImage,self).__init__()
+    self.raster = raster
+    self.set_zorder(1)
+
+  def draw(self,renderer):
+    if not self.get_visible(): return
+    R = self.raster
+    if R.fit(): R.flush()
+    gc = renderer.new_gc()
+    renderer.draw_image(gc,R.x0,R.y0,R.image)
+    gc.restore()
+    self.stale = False
 
 #--------------------------------------------------------------------------------------------------
 class GameManager (object):
@@ -422,15 +669,31 @@ Attributes
 .. attribute:: keys
 
    A bit-vector (int) holding the keys which have been pressed and not released yet; each key of interest is assigned a bit position
+
+.. attribute:: usernotify
+
+   A :class:`notify.Notifier` in charge of playing the sounds of the user output asynchronously, with repeats dropped within one frame; it is flushed at the end of each game, and closed by :meth:`close`; its backend is given by parameter *soundbackend* (default: :func:`notify.defaultbackend`)
+
+.. attribute:: lowlatency
+
+   Whether a change in the key controls is processed on arrival rather than at the next timer tick: if the timer tick is overdue (a full period has elapsed since the last frame transition), the transition is performed immediately and the animation timer is restarted; otherwise the new key controls are applied by the next tick. Either way, at most one frame transition occurs per period, so the game clock does not depend on the key events
+
+.. attribute:: render, threshold
+
+   The rendering mode of the sprites: ``scatter`` (one :func:`matplotlib.axes.Axes.scatter` artist per component), ``raster`` (a single image, see :class:`Raster`), or ``auto`` (``raster`` if the game may display more than *threshold* sprites at once, ``scatter`` otherwise); the default *threshold* is set from :func:`bench.render`, where the raster mode draws 20 to 35% faster from 1000 sprites, while the scatter mode keeps the exact marker shapes
+
+.. attribute:: latency
+
+   A dictionary holding, for each key event, the delay in sec between its arrival and the end of the first frame transition which reflects it (key ``logic``), and the first frame drawn after that transition (key ``frame``)
   """
 #--------------------------------------------------------------------------------------------------
 
-  def __init__(self,soundpath=os.path.join(os.path.dirname(__file__),'sound'),**config):
-    try: from winsound import PlaySound, SND_ASYNC, SND_FILENAME
-    except: self.usernotify = lambda sid: None
-    else:
-      D = dict((os.path.splitext(x)[0],os.path.join(soundpath,x)) for x in os.listdir(soundpath))
-      self.usernotify = lambda sid: PlaySound(D[sid],SND_ASYNC|SND_FILENAME)
+  def __init__(self,soundpath=os.path.join(os.path.dirname(__file__),'sound'),soundbackend=None,lowlatency=False,render='auto',threshold=1000,**config):
+    from notify import Notifier, loadsounds, defaultbackend
+    self.usernotify = Notifier(defaultbackend() if soundbackend is None else soundbackend,loadsounds(soundpath))
+    self.lowlatency = lowlatency
+    self.render = render
+    self.threshold = threshold
     self.config = config
 
   def play(self,game):
@@ -442,14 +705,80 @@ Plays one *game*
     """
     from matplotlib.pyplot import figure, show
     self.keys = 0
+    self.game = game
+    self.latency = dict(logic=[],frame=[])
+    self.pending, self.inflight, self.undrawn = [], [], []
+    self.last = perf_counter()
     self.figure = fig = figure()
-    def kpress(ev): self.keys |= KEYS.get(ev.key.rsplit('+',1)[-1],0)
-    def krelease(ev): self.keys &= ~KEYS.get(ev.key.rsplit('+',1)[-1],0)
+    def kpress(ev): self.keyevent(self.keys|KEYS.get(ev.key.rsplit('+',1)[-1],0))
+    def krelease(ev): self.keyevent(self.keys&~KEYS.get(ev.key.rsplit('+',1)[-1],0))
     fig.canvas.mpl_disconnect(fig.canvas.manager.key_press_handler_id)
     fig.canvas.mpl_connect('key_press_event',kpress)
     fig.canvas.mpl_connect('key_release_event',krelease)
+    fig.canvas.mpl_connect('draw_event',lambda ev: self.drawn())
+    self.usernotify.window = 1./game.fps
     game.setup(self)
     show()
+    self.usernotify.flush()
+    for k,(h,bins) in self.histogram().items():
+      if h.sum(): logger.info('latency[%s]: %s',k,', '.join('<{:.0f}ms: {}'.format(1000*b,n) for b,n in zip(bins[1:],h)))
+
+  def close(self):
+    """
+Releases the resources of the manager (sound backend). No game can be played afterwards.
+    """
+    self.usernotify.close()
+
+  def keyevent(self,keys):
+    """
+Records a change in the key controls, timestamped on arrival. In low-latency mode, also performs the pending frame transition of the game at once, if it is overdue (see :attr:`lowlatency`).
+
+:param keys: the new key controls
+:type keys: :const:`int`
+    """
+    if keys == self.keys: return # auto-repeat
+    self.keys = keys
+    self.pending.append(perf_counter())
+    if self.lowlatency:
+      game = self.game
+      src = game.anim.event_source
+      if src is None or game.gameover: return
+      if perf_counter()-self.last < 1./game.fps: return # not overdue: applied by the next tick
+      src.stop()
+      self.transition(game)
+      game.display()
+      self.figure.canvas.draw_idle()
+      src.start()
+
+  def transition(self,game):
+    """
+Performs one frame transition of *game* , with the current user input.
+
+:param game: the game to play
+:type game: :class:`Game`
+    """
+    self.userinput(game)
+    game.update()
+    self.useroutput(game)
+    self.last = perf_counter()
+
+  def drawn(self):
+    """
+Invoked each time the figure is drawn. Records the input-to-frame latency of the key events reflected in the drawn frame.
+    """
+    if self.undrawn:
+      t = perf_counter()
+      self.latency['frame'].extend(t-t0 for t0 in self.undrawn)
+      self.undrawn = []
+
+  def histogram(self,bins=(0.,.005,.01,.02,.04,.08,.16,.32,inf)):
+    """
+Returns the histograms of the latencies recorded so far, as a dictionary with the same keys as :attr:`latency` and values pairs of bin counts and bin edges (in sec).
+
+:param bins: the bin edges in sec
+:type bins: sequence of :const:`float`
+    """
+    return dict((k,histogram(L,bins)) for k,L in self.latency.items())
 
   def userinput(self,game):
     """
@@ -464,6 +793,7 @@ Turns the user input (key controls) into input for a transition of *game* .
     game.tr_quit = bool(self.keys & KEY_TERMINATE)
     game.tr_hits = False
     game.tr_miss = False
+    self.inflight, self.pending = self.pending, []
 
   def useroutput(self,game):
     """
@@ -474,6 +804,11 @@ Turns the output of a transition of *game* into user output (sound).
     """
     if game.tr_hits: self.usernotify('hits')
     if game.tr_miss: self.usernotify('miss')
+    if self.inflight:
+      t = perf_counter()
+      self.latency['logic'].extend(t-t0 for t0 in self.inflight)
+      self.undrawn.extend(self.inflight)
+      self.inflight = []
 
 KEY_MOVELEFT = 1
 KEY_MOVERIGHT = 2
@@ -4,15 +4,15 @@ import logging, os
 logger = logging.getLogger(__name__)
 
 from numpy import array, zeros, ones, empty, arange, newaxis, abs, sum, square, sqrt, log, exp, argmin, argmax, amin, amax, nonzero, all, any, nan, isnan, dot, mean, average, std
-from numpy import clip, linspace, concatenate, unique, cumsum
+from numpy import clip, linspace, concatenate, unique, cumsum, iinfo, bincount
 from numpy.random import uniform, geometric
 
-from shooter import Game as BaseGame
+from shooter import Game as BaseGame, Hits as BaseHits
 
 #----------------------------------------------------------------------------------------------------
 class Wave (object):
   """
-An object of this class implements a wave of sprites with constant vertical speed in a game.
+An object of this class implements a wave of sprites with constant vertical speed in a game. Sprites are born in groups of *P* (at the same frame).
 
 :param game: the game object
 :type game: :class:`Game`
@@ -20,16 +20,22 @@ An object of this class implements a wave of sprites with constant vertical spee
 :type v: :const:`float`
 :param orient: direction of progress of the wave
 :type orient: :const:int (+ or - 1)
+:param P: the number of sprites born at once
+:type P: :const:`int`
 
 Attributes:
 
 .. attribute:: N
 
-   the total number of exposed sprites, which is equal to the number of frames during which any of them is exposed
+   the number of frames during which any sprite is exposed (the maximum number of exposed sprites is *N* * *P* )
+
+.. attribute:: P
+
+   the number of sprites born at once
 
 .. attribute:: M
 
-   the total number of sprites, including the non exposed ones
+   the total number of sprites held in the buffers, including the non exposed ones; the buffers are circular: the sprite born in position *i* (in birth order) is held at index *i* modulo *M*
 
 .. attribute:: cslice
 
@@ -51,6 +57,14 @@ Attributes:
 
    the array of birthdates (in frame number) of the sprites as a :class:`numpy.array` (( *M* ,), :const:`int` )
 
+.. attribute:: nborn, nfill
+
+   the number of sprites born so far, resp. of sprites whose content has been produced so far; content is produced ahead of birth, in chunks, while the buffers are not full (at most *N* * *P* sprites ahead, which never overwrites an exposed sprite)
+
+.. attribute:: chunk
+
+   the minimal number of sprites for which content is produced at once
+
 .. attribute:: ypos
 
    the array of vertical positions of the exposed sprites ONLY as a :class:`numpy.array` (( *N* ,), :const:`float` )
@@ -61,57 +75,64 @@ Attributes:
   """
 #----------------------------------------------------------------------------------------------------
 
-  def __init__(self,game,v=None,orient=None):
+  def __init__(self,game,v=None,orient=None,P=1):
     self.game = game
     self.N = N = int(game.fps/v)
+    self.P = P
     self.n = 0
     self.orient = orient
-    self.M = 2*N
+    self.M = 2*N*P
     self.born,self.xpos,self.xspeed,self.alive = (zeros((self.M,),typ) for typ in (int,float,float,bool))
-    self.ialive = zeros((N,),int)
+    self.ialive = zeros((N*P,),int)
     self.nalive = 0
-    self.newcontent(t=N-1)
-    self.alive[:] = True
-    self.nborn = 0
+    self.nborn = self.nfill = 0
+    self.chunk = max(1,N//8)*P
+    self.tlast = N-1
+    self.refill()
     self.tborn = self.born[0]
     self.ypos = linspace(0.,1.,N)[slice(None,None,orient),newaxis]
     self.cslice = 0,N
 
   def update(self):
     tbeg,tend = self.cslice
-    n = self.nalive
+    n,P = self.nalive,self.P
     if n:
       a = self.ialive[:n]
       s = self.alive[a]
-      if self.born[a[0]] == tbeg and s[0]:
-        self.leaving(a[0])
-        s[0] = False
+      h = s[:P] & (self.born[a[:P]] == tbeg) # the oldest sprites are the first ones
+      if h.any():
+        self.leaving(a[:P][h])
+        s[:P] &= ~h
       n = sum(s)
       a[:n] = a[s]
     if self.tborn == tend:
-      self.ialive[n] = self.nborn
-      n += 1
-      self.entering(self.nborn)
-      self.nborn += 1
-      if self.nborn == self.M:
-        a = self.ialive[:n]
-        for comp in (self.born,self.xpos,self.xspeed): comp[:n] = comp[a]
-        a[:] = arange(n)
-        self.nborn = n
-        self.newcontent(n,tend)
-        self.alive[:] = True
-      self.tborn = self.born[self.nborn]
+      i = self.nborn%self.M
+      self.ialive[n:n+P] = range(i,i+P)
+      n += P
+      self.entering(slice(i,i+P))
+      self.nborn += P
+      self.refill()
+      self.tborn = self.born[self.nborn%self.M]
     self.nalive = n
     if n:
       a = self.ialive[:n]
       self.xpos[a] += self.xspeed[a]
     self.cslice = tbeg+1,tend+1
 
+  def refill(self):
+    k = self.nborn+self.N*self.P-self.nfill
+    if k >= self.chunk:
+      i = (self.nfill+arange(k))%self.M
+      self.newcontent(i)
+      self.alive[i] = True
+      self.tlast = self.born[i[-1]]
+      self.nfill += k
+
   def leaving(self,i): pass
   def entering(self,i): pass
 
   def setup(self,ax,**style):
-    self.artist = ax.scatter((),(),**style)
+    self.artist = self.game.scatter(ax,**style)
 
   def display(self):
     a = self.current()
@@ -145,23 +166,39 @@ Attributes:
 .. attribute:: score
 
    the cumulated number of miss
+
+.. attribute:: level
+
+   the :class:`level.Level` from which the targets are streamed, or :const:`None` if they are drawn at run time
   """
 #----------------------------------------------------------------------------------------------------
 
-  def __init__(self,game,rate=None,width=None,**ka):
+  def __init__(self,game,rate=None,width=None,level=None,**ka):
+    if level is None: self.level = None
+    else:
+      from level import Level
+      self.level = level = Level(level)
+      if level.fps != game.fps or level.N != int(game.fps/ka['v']): raise ValueError('Level incompatible with game: {}'.format(level.path))
+      rate = level.rate
     self.rate = rate/game.fps
     self.width = width
     self.score = 0
     super(Targets,self).__init__(game,orient=1,**ka)
 
-  def newcontent(self,n=0,t=-1):
-    xpos,xposc = uniform(0.,1.,(2,self.M-n))
-    self.xpos[n:] = xpos
-    self.xspeed[n:] = (xposc-xpos)/self.N
-    self.born[n:] = t+cumsum(geometric(self.rate,(self.M-n,)))
+  def newcontent(self,i):
+    if self.level is not None:
+      r = self.level.read(len(i))
+      j,i = i[:len(r)],i[len(r):]
+      self.xpos[j], self.xspeed[j], self.born[j] = r['xpos'], r['xspeed'], r['born']
+      self.born[i] = iinfo(self.born.dtype).max # level exhausted: no more targets
+      return
+    xpos,xposc = uniform(0.,1.,(2,len(i)))
+    self.xpos[i] = xpos
+    self.xspeed[i] = (xposc-xpos)/self.N
+    self.born[i] = self.tlast+cumsum(geometric(self.rate,(len(i),)))
 
   def leaving(self,i):
-    self.score += 1
+    self.score += len(i)
     self.game.tr_miss = True
 
   def setup(self,ax,**style):
@@ -174,7 +211,7 @@ Attributes:
 #----------------------------------------------------------------------------------------------------
 class Bullets (Wave):
   """
-An object of this class implements a wave of bullets in a game. A new bullet is created deterministically at a constant rate, at the lower border of the space.
+An object of this class implements a wave of bullets in a game. A new bullet is created deterministically at a constant rate, at the lower border of the space, for each avatar (see :class:`shooter.Avatar`).
 
 :param rload: the time in sec between two bullets
 :type rload: :const:`float`
@@ -185,80 +222,42 @@ Attributes:
 .. attribute:: rload
 
    the number of frames between two consecutive bullet creations
+
+.. attribute:: owner
+
+   the array of the avatars having fired the bullets as a :class:`numpy.array` (( *M* ,), :const:`int` ); since bullets are born in groups of one per avatar, it is fixed
   """
 #----------------------------------------------------------------------------------------------------
 
   def __init__(self,game,rload=None,**ka):
     self.rload = int(rload*game.fps)
-    super(Bullets,self).__init__(game,orient=-1,**ka)
+    super(Bullets,self).__init__(game,orient=-1,P=game.avatar.P,**ka)
+    self.owner = arange(self.M)%self.P
 
-  def newcontent(self,n=0,t=-1):
-    self.xpos[n:] = 0.5
-    self.xspeed[n:] = 0.
-    self.born[n:] = t+self.rload*arange(1,self.M-n+1)
+  def newcontent(self,i):
+    self.xpos[i] = 0.5
+    self.xspeed[i] = 0.
+    self.born[i] = self.tlast+self.rload*(arange(len(i))//self.P+1)
 
   def entering(self,i):
-    self.xpos[i] = self.game.avatar.pos[0,0]
+    self.xpos[i] = self.game.avatar.pos[self.owner[i],0]
 
 #----------------------------------------------------------------------------------------------------
-class Hits (object):
+class Hits (BaseHits):
   """
-An object of this class implements the hits (collisions target-bullet) in a game.
-
-:param game: the game object
-:type game: :class:`Game`
-:param timeout: the time in sec during which a hit remains visible
-:type timeout: :const:`float`
+An object of this class implements the hits (collisions target-bullet) in a game. Same as :class:`shooter.Hits`, except for the detection of the collisions on the sprites of :class:`Wave`, and the scores per avatar.
 
 Attributes:
 
-.. attribute:: timeout
-
-   the number of frames during which a hit remains visible
+.. attribute:: scores
 
-.. attribute:: tol
-
-   the tolerance in x-unit for a hit between a target and a bullet
-
-.. attribute:: clashmat
-
-   a matrix (number of targets / number of bullets) containing the time of a collision in the next frame transition (if lower than 0 or greater than 1, no collision occurs)
-
-.. attribute:: xpos
-
-   the array of horizontal positions of the hits in x-unit
-
-.. attribute:: ypos
-
-   the array of vertical positions of the hits in y-unit
-
-.. attribute:: weight
-
-   the array of remaining visibility duration (in number of frames) of the hits
-
-.. attribute:: artist
-
-   the artist in charge of displaying the hits
-
-.. attribute:: score
-
-   the cumulated number of hits
+   the cumulated number of hits per avatar (owner of the bullet) as a :class:`numpy.array` (( *P* ,), :const:`int` )
   """
 #----------------------------------------------------------------------------------------------------
 
-  def __init__(self,game,timeout=None):
-    self.game = game
-    self.timeout = int(timeout*game.fps)
-    self.tol = game.targets.width/2
-    r = game.targets.ypos
-    N = game.targets.N
-    r1 = game.bullets.ypos
-    N1 = game.bullets.N
-    self.clashmat = (r-r1.T)/(1./N+1./N1)
-    self.ypos = r
-    self.xpos = zeros((N,),float)
-    self.weight = zeros((N,),int)
-    self.score = 0
+  def __init__(self,game,**ka):
+    super(Hits,self).__init__(game,**ka)
+    self.scores = zeros((game.avatar.P,),int)
 
   def update(self):
     w,w1 = self.game.targets, self.game.bullets
@@ -272,22 +271,18 @@ Attributes:
       if len(nz)>0:
         self.game.tr_hits = True
         self.score += len(nz)
-        w.alive[w.ialive[nz]] = False
-        w1.alive[w1.ialive[nz1]] = False
-        rnz = r[nz]
-        self.weight[rnz] = self.timeout
-        self.xpos[rnz] = w.xpos[w.ialive[nz]]
-    self.weight -= 1
-    clip(self.weight,0,self.timeout,self.weight)
-
-  def setup(self,ax,**style):
-    self.artist = ax.scatter((),(),**style)
-
-  def display(self):
-    m = self.weight>0
-    self.artist.set_offsets(concatenate((self.xpos[m][:,newaxis],self.ypos[m]),axis=1))
+        self.scores += bincount(w1.owner[a1[nz1]],minlength=len(self.scores))
+        nz = unique(nz)
+        w.alive[a[nz]] = False
+        w1.alive[a1[nz1]] = False
+        self.record(w.xpos[a[nz]],r[nz])
+    self.age()
 
 class Game (BaseGame):
 
   Factory = BaseGame.Factory.copy()
   Factory.update(targets=Targets,bullets=Bullets,hits=Hits)
+  version = 1
+
+  def capacity(self):
+    return self.avatar.P+len(self.targets.ialive)+len(self.bullets.ialive)+self.hits.size
@@ -0,0 +1,319 @@
+__all__ = ('Encoder','Replica','Recorder','readheader','readframe')
+
+import logging, os, json
+logger = logging.getLogger(__name__)
+
+from struct import Struct
+from numpy import array, nonzero, concatenate, frombuffer, stack
+
+from shooter import Avatar as BaseAvatar
+from shooter2 import Game, Targets as BaseTargets, Bullets as BaseBullets, Hits as BaseHits
+from driver import Driver
+from run import todict
+
+MAGIC = b'mplshootergame-stream-1\n'
+LENGTH = Struct('<I')
+FRAME = Struct('<H')
+COUNTS = Struct('<HH')
+# frame flags
+TARGET_BIRTH = 1
+BULLET_BIRTH = 2
+AVATAR_MOVE = 4
+KILLS = 8
+SCORES = 16
+GAMEOVER = 32
+
+#--------------------------------------------------------------------------------------------------
+class Encoder (object):
+  """
+An object of this class encodes the evolution of a game (a :class:`shooter2.Game`) as a delta stream, for spectators and recorders. The stream starts with a header (see :meth:`header`), followed by one frame per frame transition (see :meth:`frame`). A frame holds only what the receiver cannot infer by itself: the sprites entering the waves (horizontal position and speed, for each of the *P* sprites of a birth), the ranks of the sprites hit (in the order of :meth:`shooter2.Wave.current`), the avatar positions when they change, and the score increments when non null (with the increments per avatar for the hits). Ageing, motion and the queue of hits are replayed by the receiver (see :class:`Replica`), so a frame is typically 3 bytes long, and at most a few dozen.
+
+:param game: the game to encode
+:type game: :class:`shooter2.Game`
+
+The game must be small enough for any frame to fit the 2-byte length prefix (which also bounds the ranks and counts, packed as 2-byte integers), otherwise :class:`ValueError` is raised.
+  """
+#--------------------------------------------------------------------------------------------------
+
+  def __init__(self,game):
+    w,w1,P = game.targets,game.bullets,game.avatar.P
+    n = len(w.ialive)+len(w1.ialive) # bound on the ranks, kill counts and score increments (all packed as u16)
+    if 1+16*(w.P+w1.P)+10*P+8+2*n >= 1<<16: raise ValueError('Waves too large for the stream format: {} exposed sprites'.format(n))
+    self.game = game
+    self.nborn = [game.targets.nborn,game.bullets.nborn]
+    self.x = game.avatar.pos[:,0].copy()
+    self.score = [game.hits.score,game.targets.score]
+    self.scores = game.hits.scores.copy()
+
+  def header(self):
+    """
+Returns the header of the stream, as bytes: a magic string, then (with a length prefix) a JSON description of the game configuration and of its current state, so that a receiver may join at any frame.
+    """
+    g = self.game
+    config = todict(g.config)
+    config['targets'].pop('level',None) # the receiver gets the targets from the stream
+    h = g.hits
+    i = h.active()
+    state = dict(
+      nstep=g.nstep,
+      avatar=g.avatar.pos[:,0].tolist(),
+      hits=dict(score=h.score,scores=h.scores.tolist(),t=h.t,xpos=h.xpos[i].tolist(),row=h.row[i].tolist(),expiry=h.expiry[i].tolist()),
+      )
+    for cn in ('targets','bullets'):
+      w = getattr(g,cn)
+      a = w.current()
+      state[cn] = dict(nborn=w.nborn,cslice=w.cslice,slot=a.tolist(),born=w.born[a].tolist(),xpos=w.xpos[a].tolist(),xspeed=w.xspeed[a].tolist(),alive=w.alive[a].tolist())
+    state['targets']['score'] = g.targets.score
+    b = json.dumps(dict(config=dict(fps=g.fps,**config),state=state)).encode()
+    return MAGIC+LENGTH.pack(len(b))+b
+
+  def frame(self):
+    """
+Returns the frame encoding the last frame transition of the game, as bytes: a 2-byte length prefix, a flag byte, then the fields given by the flags.
+    """
+    g = self.game
+    flags = 0
+    L = []
+    if g.gameover: flags |= GAMEOVER
+    else:
+      for k,(flag,w) in enumerate(((TARGET_BIRTH,g.targets),(BULLET_BIRTH,g.bullets))):
+        if w.nborn != self.nborn[k]:
+          assert w.nborn == self.nborn[k]+w.P
+          i = (w.nborn-w.P)%w.M
+          i = slice(i,i+w.P)
+          flags |= flag
+          L.append(stack((w.xpos[i],w.xspeed[i]),axis=1).astype('<f8').tobytes())
+          self.nborn[k] = w.nborn
+      x = g.avatar.pos[:,0]
+      if (x != self.x).any():
+        flags |= AVATAR_MOVE
+        L.append(x.astype('<f8').tobytes())
+        self.x[:] = x
+      w,w1 = g.targets,g.bullets
+      r,r1 = nonzero(~w.alive[w.current()])[0],nonzero(~w1.alive[w1.current()])[0]
+      if len(r) or len(r1):
+        flags |= KILLS
+        L.append(COUNTS.pack(len(r),len(r1))+concatenate((r,r1)).astype('<u2').tobytes())
+      score = [g.hits.score,g.targets.score]
+      if score != self.score:
+        flags |= SCORES
+        L.append(COUNTS.pack(score[0]-self.score[0],score[1]-self.score[1]))
+        if score[0] != self.score[0]:
+          L.append((g.hits.scores-self.scores).astype('<u2').tobytes())
+          self.scores[:] = g.hits.scores
+        self.score = score
+    b = b''.join(L)
+    return FRAME.pack(len(b)+1)+bytes((flags,))+b
+
+#--------------------------------------------------------------------------------------------------
+def readheader(source):
+  """
+Reads the header of a stream from a binary file object and returns it as a dictionary with keys ``config`` and ``state``.
+  """
+#--------------------------------------------------------------------------------------------------
+  if source.read(len(MAGIC)) != MAGIC: raise ValueError('Not a game stream')
+  n, = LENGTH.unpack(source.read(LENGTH.size))
+  return json.loads(source.read(n).decode())
+
+def readframe(source):
+  """
+Reads one frame of a stream from a binary file object and returns its flags and fields (as bytes), or :const:`None` at the end of the stream.
+  """
+  b = source.read(FRAME.size)
+  if len(b) < FRAME.size: return None
+  n, = FRAME.unpack(b)
+  b = source.read(n)
+  if len(b) < n: return None
+  return b[0],b[1:]
+
+#--------------------------------------------------------------------------------------------------
+class Wave (object):
+  """
+Mixin for the waves of a :class:`Replica`: the sprites entering the wave are given by the stream (attribute :attr:`birth`) instead of being produced by the wave.
+  """
+#--------------------------------------------------------------------------------------------------
+
+  birth = None
+
+  def refill(self): pass
+
+  def update(self):
+    tbeg,tend = self.cslice
+    n,P = self.nalive,self.P
+    if n:
+      a = self.ialive[:n]
+      s = self.alive[a]
+      s[:P] &= self.born[a[:P]] != tbeg
+      n = s.sum()
+      a[:n] = a[s]
+      a = a[:n]
+      self.xpos[a] += self.xspeed[a]
+    if self.birth is not None:
+      i = self.nborn%self.M
+      self.ialive[n:n+P] = range(i,i+P)
+      n += P
+      i = slice(i,i+P)
+      self.born[i] = tend
+      self.alive[i] = True
+      self.xpos[i],self.xspeed[i] = self.birth.T
+      self.nborn += P
+      self.birth = None
+    self.nalive = n
+    self.cslice = tbeg+1,tend+1
+
+  def restore(self,nborn=None,cslice=None,slot=None,born=None,xpos=None,xspeed=None,alive=None,**ka):
+    a = array(slot,int)
+    self.nborn = nborn
+    self.cslice = tuple(cslice)
+    self.nalive = len(a)
+    self.ialive[:len(a)] = a
+    self.born[a],self.xpos[a],self.xspeed[a],self.alive[a] = born,xpos,xspeed,alive
+
+class Targets (Wave,BaseTargets):
+  def restore(self,score=None,**ka):
+    super(Targets,self).restore(**ka)
+    self.score = score
+
+class Bullets (Wave,BaseBullets): pass
+
+class Avatar (BaseAvatar):
+  def update(self): pass
+
+class Hits (BaseHits):
+  """
+Hits of a :class:`Replica`: the ranks of the sprites hit are given by the stream (attribute :attr:`kills`); the queue of hits is replayed.
+  """
+
+  kills = None
+
+  def update(self):
+    if self.kills is not None:
+      w,w1 = self.game.targets,self.game.bullets
+      r,r1 = self.kills
+      a = w.current()[r]
+      w.alive[a] = False
+      w1.alive[w1.current()[r1]] = False
+      self.record(w.xpos[a],w.born[a]-w.cslice[0])
+      self.kills = None
+    self.age()
+
+  def restore(self,score=None,scores=None,t=None,xpos=None,row=None,expiry=None):
+    n = len(row)
+    self.score = score
+    self.scores[:] = scores
+    self.t = t
+    self.head,self.tail = 0,n
+    self.xpos[:n],self.row[:n],self.expiry[:n] = xpos,row,expiry
+
+#--------------------------------------------------------------------------------------------------
+class Replica (Game):
+  """
+An object of this class is a game rebuilt from a delta stream (see :class:`Encoder`), which can be displayed by a :class:`shooter.GameManager` like any game (the user input is ignored, except the quit command). Each frame transition reads one frame from the stream, which blocks until it is available: the spectator follows the pace of the game. The game is over when the stream says so or ends.
+
+:param source: the stream, as a binary file object (file, pipe) positioned at its header
+  """
+#--------------------------------------------------------------------------------------------------
+
+  Factory = Game.Factory.copy()
+  Factory.update(avatar=Avatar,targets=Targets,bullets=Bullets,hits=Hits)
+
+  def __init__(self,source):
+    self.source = source
+    h = readheader(source)
+    super(Replica,self).__init__(**h['config'])
+    S = h['state']
+    self.nstep = S['nstep']
+    self.avatar.pos[:,0] = S['avatar']
+    for cn in ('targets','bullets','hits'): getattr(self,cn).restore(**S[cn])
+
+  def update(self):
+    if not self.tr_quit:
+      f = readframe(self.source)
+      if f is None or f[0]&GAMEOVER: self.tr_quit = True
+      else: self.apply(*f)
+    super(Replica,self).update()
+
+  def apply(self,flags,b):
+    k = 0
+    for flag,w in ((TARGET_BIRTH,self.targets),(BULLET_BIRTH,self.bullets)):
+      if flags&flag:
+        w.birth = frombuffer(b,'<f8',2*w.P,k).reshape((w.P,2))
+        k += 16*w.P
+    if flags&AVATAR_MOVE:
+      P = self.avatar.P
+      self.avatar.pos[:,0] = frombuffer(b,'<f8',P,k)
+      k += 8*P
+    if flags&KILLS:
+      n,n1 = COUNTS.unpack_from(b,k)
+      k += COUNTS.size
+      r = frombuffer(b,'<u2',n+n1,k).astype(int)
+      self.hits.kills = r[:n],r[n:]
+      k += 2*(n+n1)
+    if flags&SCORES:
+      dh,dm = COUNTS.unpack_from(b,k)
+      k += COUNTS.size
+      if dh: self.hits.scores += frombuffer(b,'<u2',self.avatar.P,k)
+      self.hits.score += dh
+      self.targets.score += dm
+      self.tr_hits,self.tr_miss = dh>0,dm>0
+
+#--------------------------------------------------------------------------------------------------
+class Recorder (Driver):
+  """
+An object of this class is a :class:`driver.Driver` which also broadcasts the delta stream of its game (see :class:`Encoder`) to a set of outputs (binary file objects, e.g. files or pipes to spectators). An output may be attached at any time: it then receives a header holding the current state of the game. When a new game starts, the attached outputs receive the header of its stream. An output which fails (e.g. a spectator which closed its pipe) is detached.
+
+:param outputs: the initial outputs
+:param ka: passed to :class:`driver.Driver`
+
+Attributes:
+
+.. attribute:: outputs
+
+   the list of attached outputs
+
+.. attribute:: encoder
+
+   the :class:`Encoder` of the current game
+  """
+#--------------------------------------------------------------------------------------------------
+
+  def __init__(self,outputs=(),**ka):
+    super(Recorder,self).__init__(**ka)
+    self.outputs = list(outputs)
+    self.encoder = None
+
+  def start(self,game):
+    super(Recorder,self).start(game)
+    self.encoder = Encoder(game)
+    L,self.outputs = self.outputs,[]
+    for out in L: self.attach(out)
+
+  def attach(self,out):
+    """
+Attaches an output to the stream of the current game.
+    """
+    if self.encoder is None or self.send(out,self.encoder.header()): self.outputs.append(out)
+
+  def useroutput(self,game):
+    super(Recorder,self).useroutput(game)
+    b = self.encoder.frame()
+    self.outputs = [out for out in self.outputs if self.send(out,b)]
+
+  def send(self,out,b):
+    try: out.write(b); out.flush(); return True
+    except (OSError,ValueError): logger.info('Output detached: %s',out); return False
+
+if __name__ == '__main__':
+  import sys
+  from run import config, mgr
+  from driver import newgame, randomkeys
+  logging.basicConfig(level=logging.INFO)
+  # python stream.py record FILE [NFRAMES] | python stream.py watch FILE (FILE may be - for stdout/stdin)
+  cmd,path = sys.argv[1:3]
+  if cmd == 'record':
+    nframes = int(sys.argv[3]) if len(sys.argv)>3 else 10000
+    with (sys.stdout.buffer if path=='-' else open(path,'wb')) as out:
+      Recorder((out,),policy=randomkeys(),nframes=nframes).play(newgame(None,**config()))
+  elif cmd == 'watch':
+    with (sys.stdin.buffer if path=='-' else open(path,'rb')) as source:
+      mgr().play(Replica(source))
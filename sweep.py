@@ -0,0 +1,139 @@
+__all__ = ('sweep','grid','keyof','Cache','Policies','session')
+
+import logging, os, json, hashlib
+logger = logging.getLogger(__name__)
+
+from itertools import product
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from copy import deepcopy
+
+from driver import Driver, newgame, randomkeys
+from run import todict, getpath
+
+Policies = dict(
+  idle=lambda seed: None,
+  random=lambda seed: randomkeys(seed),
+  )
+
+#--------------------------------------------------------------------------------------------------
+class Cache (object):
+  """
+An object of this class is an on-disk, content-addressed result cache. Each result is a JSON file named after its key, in a sub-directory named after the first two characters of the key. Results are written atomically, so an interrupted writer never leaves a partial entry.
+
+:param path: the root directory of the cache (created if needed)
+:type path: :const:`str`
+  """
+#--------------------------------------------------------------------------------------------------
+
+  def __init__(self,path):
+    self.path = path
+    os.makedirs(path,exist_ok=True)
+
+  def locate(self,key): return os.path.join(self.path,key[:2],key+'.json')
+
+  def __contains__(self,key): return os.path.exists(self.locate(key))
+
+  def __getitem__(self,key):
+    with open(self.locate(key)) as u: return json.load(u)
+
+  def __setitem__(self,key,value):
+    p = self.locate(key)
+    os.makedirs(os.path.dirname(p),exist_ok=True)
+    with open(p+'.tmp','w') as u: json.dump(value,u)
+    os.replace(p+'.tmp',p)
+
+#--------------------------------------------------------------------------------------------------
+def grid(base,axes):
+  """
+Returns the list of configurations of a grid. Each configuration is a copy of *base* (as nested :class:`dict`) where the value of each axis is replaced by one of its values.
+
+:param base: the base configuration, as built by :func:`run.config`
+:param axes: a dictionary mapping each axis, given as a dotted path in the configuration (e.g. ``targets.rate``), to its list of values
+:type axes: :const:`dict`
+  """
+#--------------------------------------------------------------------------------------------------
+  base = todict(base)
+  L = []
+  for values in product(*axes.values()):
+    D = deepcopy(base)
+    for path,v in zip(axes,values):
+      path,_,last = path.rpartition('.')
+      (getpath(D,path) if path else D)[last] = v
+    L.append(D)
+  return L
+
+def keyof(config,seed,policy,nframes,factory=None):
+  """
+Returns the content address (hex digest) of a combination of configuration, seed, policy, session length and game class (default: :class:`shooter2.Game`), including the version of the game class (see :attr:`shooter.Game.version`).
+  """
+  if factory is None: from shooter2 import Game as factory
+  engine = '{}.{}'.format(factory.__module__,factory.__name__),factory.version
+  return hashlib.sha1(json.dumps((config,seed,policy,nframes,engine),sort_keys=True).encode()).hexdigest()
+
+#--------------------------------------------------------------------------------------------------
+def session(config,seed,policy,nframes,factory=None):
+  """
+Plays one headless game session and returns its outcome as a dictionary.
+
+:param config: the game configuration
+:type config: :const:`dict`
+:param seed: the seed of the game and of the policy
+:type seed: :const:`int`
+:param policy: the name of the policy, in :data:`Policies`
+:type policy: :const:`str`
+:param nframes: the number of frame transitions of the session
+:type nframes: :const:`int`
+:param factory: passed to :func:`driver.newgame`
+  """
+#--------------------------------------------------------------------------------------------------
+  game = newgame(seed,factory,**config)
+  Driver(Policies[policy](seed),nframes).play(game)
+  return dict(nstep=game.nstep,hits=game.hits.score,miss=game.targets.score,perf=game.perf)
+
+#--------------------------------------------------------------------------------------------------
+def sweep(axes,base=None,seeds=(0,),policy='random',nframes=10000,factory=None,cache='sweep.cache',workers=None):
+  """
+Runs a parameter sweep over a grid (see :func:`grid`), with one headless session (see :func:`session`) per grid point and seed. Each session is identified by its content address (see :func:`keyof`); the sessions already present in the *cache* are skipped, the others are spread over a process pool and their outcome is stored in the cache as soon as it completes, so an interrupted sweep resumes where it stopped. A failed session is logged and does not stop the others; :class:`RuntimeError` is raised once all of them are done. Returns the list of records (configuration, seed, policy, nframes, outcome) of all the sessions of the grid, in grid order.
+
+:param axes: passed to :func:`grid`
+:param base: the base configuration (default: :func:`run.config`)
+:param seeds: the list of seeds for each grid point
+:param policy: the name of the policy
+:type policy: :const:`str`
+:param nframes: the number of frame transitions per session
+:type nframes: :const:`int`
+:param factory: the game class (default: :class:`shooter2.Game`)
+:param cache: the path of the result cache
+:type cache: :const:`str`
+:param workers: the number of worker processes (default: number of cpus)
+:type workers: :const:`int`
+  """
+#--------------------------------------------------------------------------------------------------
+  if base is None: from run import config; base = config()
+  cache = Cache(cache)
+  jobs = [(keyof(c,s,policy,nframes,factory),(c,s,policy,nframes)) for c in grid(base,axes) for s in seeds]
+  todo = dict((k,job) for k,job in jobs if k not in cache)
+  logger.info('Sweep: %d sessions, %d cached, %d to compute',len(jobs),len(jobs)-len(todo),len(todo))
+  if todo:
+    with ProcessPoolExecutor(workers) as pool:
+      F = dict((pool.submit(session,*job,factory),k) for k,job in todo.items())
+      failed = []
+      for i,f in enumerate(as_completed(F),1):
+        k = F[f]
+        c,s,p,n = todo[k]
+        try: outcome = f.result()
+        except Exception as e:
+          logger.error('Sweep: session %s failed (seed=%s): %s: %s',k,s,type(e).__name__,e)
+          failed.append(e)
+          continue
+        cache[k] = dict(config=c,seed=s,policy=p,nframes=n,outcome=outcome)
+        if i%100 == 0: logger.info('Sweep: %d/%d sessions computed',i,len(todo))
+    if failed: raise RuntimeError('Sweep: {}/{} sessions failed, the others are cached'.format(len(failed),len(todo))) from failed[0]
+  return [cache[k] for k,job in jobs]
+
+if __name__ == '__main__':
+  import sys
+  logging.basicConfig(level=logging.INFO)
+  axes = dict((a.split('=')[0],[float(v) for v in a.split('=')[1].split(',')]) for a in sys.argv[1:] if '=' in a)
+  for r in sweep(axes,seeds=range(4)):
+    print(' '.join('{}={}'.format(a,getpath(r['config'],a)) for a in axes),'seed={seed}'.format(**r),'hits={hits} miss={miss}'.format(**r['outcome']))
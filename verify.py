@@ -0,0 +1,118 @@
+__all__ = ('check','verify','watch','Factories')
+
+import logging, os
+logger = logging.getLogger(__name__)
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait
+from importlib import import_module
+from time import perf_counter, sleep
+
+from driver import Driver, newgame
+from replay import Replay
+from run import config as default, todict
+
+# game classes accepted in submissions
+Factories = ('shooter.Game','shooter2.Game')
+
+#--------------------------------------------------------------------------------------------------
+def check(path,config=None,maxframes=90000):
+  """
+Verifies one submitted replay file (see :class:`replay.Archiver`): the game is re-simulated from scratch, from the seed and configuration of the header and the recorded key controls, and the outcome is compared with the claimed summary. The keyframes of the file are never loaded (they are pickles, which must not be trusted). Returns the verdict as a dictionary with keys ``path``, ``ok`` (whether the claim holds), ``claimed`` and ``computed`` (outcomes: ``nstep``, ``hits``, ``miss``), ``error`` (the reason of the rejection of an invalid file, or :const:`None`) and ``time`` (the verification time in sec).
+
+:param path: the path of the replay file
+:type path: :const:`str`
+:param config: the expected game configuration, including ``fps`` (default: :func:`run.config`); submissions are untrusted, so a file with any other configuration is rejected before a game is built
+:type config: :const:`dict`
+:param maxframes: the maximum number of frame transitions of a session (default: one hour at 25 fps), checked from the index table before any key control is read
+:type maxframes: :const:`int`
+  """
+#--------------------------------------------------------------------------------------------------
+  t = perf_counter()
+  if config is None: config = todict(default())
+  V = dict(path=path,ok=False,claimed=None,computed=None,error=None)
+  try:
+    r = Replay(path)
+    h = r.header
+    V['claimed'] = dict((k,r.summary[k]) for k in ('nstep','hits','miss'))
+    if h['factory'] not in Factories: raise ValueError('Game class not accepted: {}'.format(h['factory']))
+    if h['seed'] is None: raise ValueError('Missing seed')
+    if h['config'] != config: raise ValueError('Configuration mismatch')
+    if r.ninputs > maxframes+1: raise ValueError('Session too long')
+    keys = r.inputs()
+    m,c = h['factory'].rsplit('.',1)
+    game = newgame(h['seed'],getattr(import_module(m),c),**h['config'])
+    mgr = Driver(policy=lambda game: int(keys[game.nstep]))
+    mgr.start(game)
+    while not game.gameover and game.nstep < len(keys): mgr.step()
+    V['computed'] = D = dict(nstep=game.nstep,hits=game.hits.score,miss=game.targets.score)
+    V['ok'] = D == V['claimed']
+  except Exception as e: V['error'] = '{}: {}'.format(type(e).__name__,e)
+  V['time'] = perf_counter()-t
+  return V
+
+#--------------------------------------------------------------------------------------------------
+def verify(paths,workers=None,chunksize=8,**ka):
+  """
+Verifies a sequence of replay files (see :func:`check`) over a process pool, and generates the verdicts in the order of *paths*, as soon as available. The files are sent to the workers in batches of *chunksize*, so that the cost per file is dominated by the simulation.
+
+:param paths: an iterable of paths of replay files
+:param workers: the number of worker processes (default: number of cpus)
+:type workers: :const:`int`
+:param chunksize: the number of files per batch sent to a worker
+:type chunksize: :const:`int`
+:param ka: passed to :func:`check`
+  """
+#--------------------------------------------------------------------------------------------------
+  with ProcessPoolExecutor(workers,initializer=preload) as pool:
+    yield from pool.map(Check(ka),paths,chunksize=chunksize)
+
+#--------------------------------------------------------------------------------------------------
+def watch(directory,suffix='.replay',period=1.,workers=None,backlog=None,**ka):
+  """
+Watches a directory of submissions and generates the verdicts (see :func:`check`) of the replay files which appear in it, in arrival order (modification time), as soon as available. Submissions must be moved into the directory atomically (e.g. by :func:`os.replace`) once complete. The workers of the process pool are kept busy with up to *backlog* pending files; the generator never ends.
+
+:param directory: the path of the directory
+:type directory: :const:`str`
+:param suffix: the suffix of the names of the replay files
+:type suffix: :const:`str`
+:param period: the time in sec between two scans of the directory
+:type period: :const:`float`
+:param workers: the number of worker processes (default: number of cpus)
+:type workers: :const:`int`
+:param backlog: the maximum number of pending files (default: 4 times the number of workers)
+:type backlog: :const:`int`
+:param ka: passed to :func:`check`
+  """
+#--------------------------------------------------------------------------------------------------
+  if workers is None: workers = os.cpu_count()
+  if backlog is None: backlog = 4*workers
+  seen = set()
+  queue = deque()
+  pending = deque()
+  with ProcessPoolExecutor(workers,initializer=preload) as pool:
+    while True:
+      if not queue:
+        with os.scandir(directory) as L: new = [(e.stat().st_mtime,e.path) for e in L if e.name.endswith(suffix) and e.path not in seen]
+        new.sort()
+        seen.update(p for t,p in new)
+        queue.extend(p for t,p in new)
+      while queue and len(pending) < backlog: pending.append(pool.submit(check,queue.popleft(),**ka))
+      if not pending: sleep(period); continue
+      wait((pending[0],),timeout=period)
+      while pending and pending[0].done(): yield pending.popleft().result()
+
+class Check (object):
+  def __init__(self,ka): self.ka = ka
+  def __call__(self,path): return check(path,**self.ka)
+
+def preload():
+  for m in Factories: import_module(m.rsplit('.',1)[0])
+
+if __name__ == '__main__':
+  import sys
+  logging.basicConfig(level=logging.INFO)
+  # python verify.py DIRECTORY: watch a directory of submissions
+  for V in watch(sys.argv[1]):
+    if V['error']: logger.warning('%s: rejected (%s)',V['path'],V['error'])
+    else: logger.info('%s: %s (%.2fs) claimed=%s computed=%s',V['path'],'ok' if V['ok'] else 'FAILED',V['time'],V['claimed'],V['computed'])